@@ -3,20 +3,50 @@ from discord.ext import commands
 from discord import app_commands
 import asyncio
 import aiohttp
+import json
 import logging
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
-from utils.jsondb import safe_load, safe_save
-from config import SESIONES_FILE, DATA_DIR
+from typing import Dict, List, Optional, Set
+from utils.player_stats import get_player_stats
+from utils.keyed_workers import KeyedWorkerPool
+from utils.event_dedup import get_event_store
+from utils.endpoint_health import EndpointHealth
+from utils.target_registry import get_target_registry
+from utils.despachador import get_despachador
+from utils.resolver_discord import get_discord_resolver
+from config import DATA_DIR
 
 logger = logging.getLogger(__name__)
 
 CODESPACES_FILE = f'{DATA_DIR}/codespaces_monitored.json'
 
+# Streaming (SSE) de eventos: si el Codespace no lo soporta se vuelve a
+# intentar pasado este tiempo; mientras tanto se usa polling.
+STREAM_REINTENTO_SIN_SOPORTE = 600
+STREAM_MAX_FALLOS = 5
+STREAM_BACKOFF_MAX = 60
+
+# Acks en lote: se envían al final de cada ciclo o al llegar a este tamaño
+ACK_BATCH_MAX = 50
+
+# Procesamiento de eventos: en paralelo entre usuarios, en orden por usuario
+EVENT_WORKERS = 10
+EVENT_MAX_PENDIENTES = 500
+
+# Limpieza periódica del registro de eventos ya entregados
+PURGA_ENTREGADOS_INTERVALO = 3600
+
+# Respuestas de Cloudflare cuando el túnel ya no existe o no responde
+ESTADOS_TUNEL_CAIDO = (502, 503, 504, 521, 522, 523, 524, 530)
+SONDA_TIMEOUT = 5
+
 
 class CodespaceEventConsumer:
     """
-    Consumer que pollea eventos desde el Codespace
+    Consumer de eventos desde el Codespace.
+    Usa una suscripción SSE por Codespace (/discord/events/stream) y,
+    si no está soportada, pollea /discord/events.
     Adaptado de d0ce3-Addons/discord_consumer_example.py
     """
     
@@ -25,34 +55,51 @@ class CodespaceEventConsumer:
         self.poll_interval = poll_interval
         self.session: Optional[aiohttp.ClientSession] = None
         self.running = False
+        self.streams: Dict[str, asyncio.Task] = {}
+        self.sin_stream: Dict[str, float] = {}
+        self.ultimo_evento: Dict[str, str] = {}
+        self.acks: Dict[str, List[Dict]] = {}
+        self.sin_batch: Set[str] = set()
+        self.workers = KeyedWorkerPool(max_workers=EVENT_WORKERS, max_pending=EVENT_MAX_PENDIENTES)
+        self.en_proceso: Set[tuple] = set()
+        self.entregados = get_event_store()
+        self.ultima_purga = 0.0
+        self.salud = EndpointHealth()
+        self.registro = get_target_registry()
+        self.resolver = get_discord_resolver()
+        self.resolver.configurar(bot)
         self.stats = {
             'total_polled': 0,
             'total_processed': 0,
             'total_failed': 0,
+            'total_streamed': 0,
+            'acks_batch': 0,
+            'acks_individuales': 0,
             'last_poll': None
         }
     
     def get_codespace_urls(self) -> List[str]:
-        sesiones = safe_load(SESIONES_FILE)
-        urls = []
+        return self.registro.urls()
+    
+    def _cambio_de_objetivo(self, evento: str, codespace_url: str):
+        """Reacciona a altas y bajas del registro de Codespaces"""
+        if not self.running:
+            return
         
-        for uid, data in sesiones.items():
-            # Prioridad 1: URL de Cloudflare Tunnel
-            tunnel_url = data.get('tunnel_url')
-            
-            if tunnel_url:
-                urls.append(tunnel_url)
-            else:
-                # Fallback: URL de Codespace nativa
-                codespace_url = data.get('codespace_url')
-                if codespace_url:
-                    if not codespace_url.startswith('http'):
-                        codespace_url = f'https://{codespace_url}'
-                    if not codespace_url.endswith(':8080'):
-                        codespace_url = codespace_url.rstrip('/') + ':8080'
-                    urls.append(codespace_url)
+        if evento == 'alta':
+            logger.info(f"➕ Codespace registrado: {codespace_url}")
+            self._abrir_stream(codespace_url)
+            return
         
-        return list(set(urls))
+        logger.info(f"➖ Codespace dado de baja: {codespace_url}")
+        task = self.streams.pop(codespace_url, None)
+        if task:
+            task.cancel()
+        self.sin_stream.pop(codespace_url, None)
+        self.ultimo_evento.pop(codespace_url, None)
+        self.acks.pop(codespace_url, None)
+        self.sin_batch.discard(codespace_url)
+        self.salud.olvidar(codespace_url)
     
     async def start(self):
         if self.running:
@@ -62,12 +109,25 @@ class CodespaceEventConsumer:
         self.running = True
         self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
         
+        self.registro.cargar()
+        self.registro.suscribir(self._cambio_de_objetivo)
+        
         logger.info(f"🚀 Consumer iniciado - polling cada {self.poll_interval}s")
         
         asyncio.create_task(self._polling_loop())
     
     async def stop(self):
         self.running = False
+        self.registro.desuscribir(self._cambio_de_objetivo)
+        
+        for task in list(self.streams.values()):
+            task.cancel()
+        if self.streams:
+            await asyncio.gather(*self.streams.values(), return_exceptions=True)
+        self.streams.clear()
+        
+        await self.workers.stop()
+        await self._flush_all_acks()
         
         if self.session:
             await self.session.close()
@@ -79,14 +139,145 @@ class CodespaceEventConsumer:
         while self.running:
             try:
                 codespace_urls = self.get_codespace_urls()
-                if codespace_urls:
-                    await self._poll_all_codespaces(codespace_urls)
+                
+                ahora = time.monotonic()
+                disponibles = [url for url in codespace_urls if self.salud.disponible(url, ahora)]
+                sondas = [url for url in disponibles if self.salud.en_cuarentena(url)]
+                disponibles = [url for url in disponibles if url not in sondas]
+                
+                # Endpoints caídos o en espera no reciben stream ni polling
+                self._sync_streams(disponibles + [url for url in codespace_urls if url in self.streams])
+                
+                # Los Codespaces con stream activo no necesitan polling
+                pendientes = [url for url in disponibles if url not in self.streams]
+                if pendientes or sondas:
+                    await asyncio.gather(
+                        self._poll_all_codespaces(pendientes),
+                        *[self._sondear_recuperacion(url) for url in sondas],
+                        return_exceptions=True
+                    )
+                await self._flush_all_acks()
                 self.stats['last_poll'] = datetime.now().isoformat()
+                
+                if time.monotonic() - self.ultima_purga > PURGA_ENTREGADOS_INTERVALO:
+                    self.ultima_purga = time.monotonic()
+                    self.entregados.purgar()
             except Exception as e:
                 logger.error(f"❌ Error en polling loop: {e}", exc_info=True)
             
             await asyncio.sleep(self.poll_interval)
     
+    def _sync_streams(self, codespace_urls: List[str]):
+        """Abre streams para Codespaces nuevos y cierra los que ya no existen"""
+        activos = set(codespace_urls)
+        
+        for url in list(self.streams):
+            if url not in activos:
+                self.streams.pop(url).cancel()
+        
+        for url in codespace_urls:
+            self._abrir_stream(url)
+    
+    def _abrir_stream(self, codespace_url: str):
+        if codespace_url in self.streams or self.sin_stream.get(codespace_url, 0) > time.monotonic():
+            return
+        task = asyncio.create_task(self._stream_codespace(codespace_url))
+        task.add_done_callback(lambda t: self._stream_terminado(codespace_url, t))
+        self.streams[codespace_url] = task
+    
+    def _stream_terminado(self, codespace_url: str, task: asyncio.Task):
+        if self.streams.get(codespace_url) is task:
+            del self.streams[codespace_url]
+    
+    async def _stream_codespace(self, codespace_url: str):
+        """
+        Mantiene una suscripción SSE al Codespace con reconexión automática,
+        reanudando desde el último evento recibido (Last-Event-ID).
+        """
+        stream_url = f"{codespace_url}/discord/events/stream"
+        fallos = 0
+        
+        while self.running:
+            headers = {'Accept': 'text/event-stream'}
+            if codespace_url in self.ultimo_evento:
+                headers['Last-Event-ID'] = self.ultimo_evento[codespace_url]
+            
+            try:
+                async with self.session.get(
+                    stream_url,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=90)
+                ) as response:
+                    content_type = response.headers.get('Content-Type', '')
+                    
+                    if response.status in (404, 405, 501) or (
+                        response.status == 200 and 'text/event-stream' not in content_type
+                    ):
+                        logger.info(f"ℹ️  {codespace_url} no soporta streaming, usando polling")
+                        self.sin_stream[codespace_url] = time.monotonic() + STREAM_REINTENTO_SIN_SOPORTE
+                        return
+                    
+                    if response.status != 200:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status
+                        )
+                    
+                    logger.info(f"📡 Stream conectado a {codespace_url}")
+                    self.salud.registrar_exito(codespace_url)
+                    fallos = 0
+                    await self._leer_stream(response, codespace_url)
+            
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"Stream de {codespace_url} interrumpido: {e}")
+            except Exception as e:
+                logger.error(f"❌ Error en stream de {codespace_url}: {e}")
+            
+            fallos += 1
+            if fallos >= STREAM_MAX_FALLOS:
+                # Dejar que el polling tome el relevo por un tiempo
+                self.sin_stream[codespace_url] = time.monotonic() + self.poll_interval * 4
+                return
+            
+            await asyncio.sleep(min(2 ** fallos, STREAM_BACKOFF_MAX))
+    
+    async def _leer_stream(self, response: aiohttp.ClientResponse, codespace_url: str):
+        """Parsea mensajes SSE (id/event/data) y procesa cada evento recibido"""
+        event_id = None
+        data_lines = []
+        
+        async for raw_line in response.content:
+            line = raw_line.decode('utf-8').rstrip('\r\n')
+            
+            if line.startswith(':'):
+                continue
+            
+            if line:
+                field, _, value = line.partition(':')
+                value = value[1:] if value.startswith(' ') else value
+                if field == 'id':
+                    event_id = value
+                elif field == 'data':
+                    data_lines.append(value)
+                continue
+            
+            if data_lines:
+                try:
+                    data = json.loads('\n'.join(data_lines))
+                except ValueError:
+                    logger.warning(f"⚠️  Mensaje SSE inválido desde {codespace_url}")
+                else:
+                    events = data.get('events', [data]) if isinstance(data, dict) else data
+                    for event in events:
+                        await self._submit_event(event, codespace_url)
+                    self.stats['total_streamed'] += len(events)
+            
+            if event_id is not None:
+                self.ultimo_evento[codespace_url] = event_id
+            event_id = None
+            data_lines = []
+    
     async def _poll_all_codespaces(self, codespace_urls: List[str]):
         tasks = [
             self._poll_codespace(url)
@@ -100,6 +291,11 @@ class CodespaceEventConsumer:
             events_url = f"{codespace_url}/discord/events"
             
             async with self.session.get(events_url) as response:
+                if response.status in ESTADOS_TUNEL_CAIDO:
+                    self.salud.registrar_fallo(codespace_url)
+                else:
+                    self.salud.registrar_exito(codespace_url)
+                
                 if response.status == 200:
                     data = await response.json()
                     
@@ -109,8 +305,13 @@ class CodespaceEventConsumer:
                         if events:
                             logger.info(f"📦 {len(events)} evento(s) desde {codespace_url}")
                             
-                            for event in events:
-                                await self._process_event(event, codespace_url)
+                            pendientes = [
+                                await self._submit_event(event, codespace_url)
+                                for event in events
+                            ]
+                            await asyncio.gather(*pendientes, return_exceptions=True)
+                            
+                            self.ultimo_evento[codespace_url] = str(events[-1]['id'])
                         
                         self.stats['total_polled'] += len(events)
                     else:
@@ -119,10 +320,52 @@ class CodespaceEventConsumer:
                 elif response.status != 404:
                     logger.warning(f"⚠️  HTTP {response.status} desde {codespace_url}")
         
-        except aiohttp.ClientError:
-            pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.salud.registrar_fallo(codespace_url)
         except Exception as e:
             logger.error(f"❌ Error polling {codespace_url}: {e}")
+        
+        await self._flush_acks(codespace_url)
+    
+    async def _sondear_recuperacion(self, codespace_url: str):
+        """Consulta breve a un endpoint en cuarentena para ver si volvió"""
+        try:
+            async with self.session.get(
+                f"{codespace_url}/discord/events",
+                timeout=aiohttp.ClientTimeout(total=SONDA_TIMEOUT)
+            ) as response:
+                vivo = response.status not in ESTADOS_TUNEL_CAIDO
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            vivo = False
+        
+        if vivo:
+            logger.info(f"💚 {codespace_url} volvió a responder, sale de cuarentena")
+            self.salud.registrar_exito(codespace_url)
+        else:
+            self.salud.registrar_fallo(codespace_url)
+    
+    async def _submit_event(self, event: Dict, codespace_url: str) -> asyncio.Future:
+        """
+        Encola un evento en el pool de workers (ordenado por usuario).
+        Un evento que ya está en cola o en proceso no se vuelve a encolar.
+        """
+        clave = (codespace_url, event.get('id'))
+        if clave in self.en_proceso:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+        
+        self.en_proceso.add(clave)
+        try:
+            future = await self.workers.submit(
+                str(event.get('user_id')),
+                lambda: self._process_event(event, codespace_url)
+            )
+        except BaseException:
+            self.en_proceso.discard(clave)
+            raise
+        future.add_done_callback(lambda f: self.en_proceso.discard(clave))
+        return future
     
     async def _process_event(self, event: Dict, codespace_url: str):
         event_id = event['id']
@@ -130,10 +373,20 @@ class CodespaceEventConsumer:
         user_id = event['user_id']
         payload = event['payload']
         
+        # La URL del túnel cambia entre reinicios; el nombre del Codespace no
+        codespace_name = payload.get('codespace_name') if isinstance(payload, dict) else None
+        clave = f"{user_id}/{codespace_name}" if codespace_name else codespace_url
+        
         try:
+            if self.entregados.entregado(clave, event_id):
+                # Ya se entregó pero el ack se perdió: solo confirmar de nuevo
+                logger.info(f"↩️ Evento #{event_id} ya entregado, reenviando ack")
+                await self._mark_processed(event_id, codespace_url)
+                return
+            
             logger.info(f"🔄 Procesando evento #{event_id}: {event_type}")
             
-            user = await self.bot.fetch_user(int(user_id))
+            user = await self.resolver.usuario(user_id)
             if not user:
                 logger.warning(f"⚠️  Usuario {user_id} no encontrado")
                 await self._mark_failed(event_id, codespace_url, "Usuario no encontrado")
@@ -156,6 +409,7 @@ class CodespaceEventConsumer:
                 await self._mark_failed(event_id, codespace_url, f"Tipo desconocido: {event_type}")
                 return
             
+            self.entregados.registrar(clave, event_id)
             await self._mark_processed(event_id, codespace_url)
             self.stats['total_processed'] += 1
             logger.info(f"✅ Evento #{event_id} procesado")
@@ -180,10 +434,7 @@ class CodespaceEventConsumer:
         embed.add_field(name='Tipo', value=error_type, inline=True)
         embed.set_footer(text='d0ce3|tools • Backup Monitor')
         
-        try:
-            await user.send(embed=embed)
-        except discord.Forbidden:
-            logger.warning(f"No se pudo enviar DM a {user.id}")
+        await self._notificar(user, embed, 'backup_error')
     
     async def _handle_backup_success(self, user, payload):
         backup_file = payload.get('backup_file', 'Desconocido')
@@ -202,10 +453,7 @@ class CodespaceEventConsumer:
         embed.add_field(name='Codespace', value=codespace_name, inline=True)
         embed.set_footer(text='d0ce3|tools • Backup Monitor')
         
-        try:
-            await user.send(embed=embed)
-        except discord.Forbidden:
-            logger.warning(f"No se pudo enviar DM a {user.id}")
+        await self._notificar(user, embed, 'backup_success')
     
     async def _handle_minecraft_status(self, user, payload):
         """Maneja cambios de estado de Minecraft"""
@@ -214,6 +462,9 @@ class CodespaceEventConsumer:
         port = payload.get('port', 25565)
         players = payload.get('players_online', 0)
         
+        if ip and status in ('online', 'offline'):
+            get_player_stats().registrar(f'{ip}:{port}', status == 'online', players)
+        
         status_emoji = {
             'online': '✅',
             'offline': '❌',
@@ -236,10 +487,7 @@ class CodespaceEventConsumer:
         if status == 'online':
             embed.add_field(name='Jugadores', value=str(players), inline=True)
         
-        try:
-            await user.send(embed=embed)
-        except discord.Forbidden:
-            logger.warning(f"No se pudo enviar DM a {user.id}")
+        await self._notificar(user, embed, 'minecraft_status')
     
     async def _handle_codespace_status(self, user, payload):
         """Maneja cambios de estado del Codespace"""
@@ -270,34 +518,108 @@ class CodespaceEventConsumer:
                     inline=True
                 )
         
-        try:
-            await user.send(embed=embed)
-        except discord.Forbidden:
-            logger.warning(f"No se pudo enviar DM a {user.id}")
+        await self._notificar(user, embed, 'codespace_status')
+    
+    async def _notificar(self, user, embed: discord.Embed, event_type: str):
+        """Notifica al usuario según su preferencia; si falla queda en la cola de reintentos"""
+        # Solo se encola: esperar el envío dentro del trabajo ordenado del
+        # usuario impediría agrupar sus eventos en un mismo mensaje.
+        # Los errores se avisan al momento aunque el usuario use modo resumen
+        await get_despachador().notificar_usuario(
+            user.id,
+            embed=embed,
+            origen=f"addon:{event_type}",
+            urgente=event_type == 'backup_error'
+        )
     
     async def _mark_processed(self, event_id: int, codespace_url: str):
-        """Marca un evento como procesado"""
+        """Marca un evento como procesado (se envía en el próximo lote)"""
+        await self._queue_ack(codespace_url, {'id': event_id, 'status': 'processed'})
+    
+    async def _mark_failed(self, event_id: int, codespace_url: str, error_message: str):
+        """Marca un evento como fallido (se envía en el próximo lote)"""
+        await self._queue_ack(codespace_url, {
+            'id': event_id,
+            'status': 'failed',
+            'error_message': error_message
+        })
+    
+    async def _queue_ack(self, codespace_url: str, ack: Dict):
+        if codespace_url in self.sin_batch:
+            await self._send_single_ack(codespace_url, ack)
+            return
+        
+        pendientes = self.acks.setdefault(codespace_url, [])
+        pendientes.append(ack)
+        if len(pendientes) >= ACK_BATCH_MAX:
+            await self._flush_acks(codespace_url)
+    
+    async def _flush_all_acks(self):
+        if self.acks:
+            await asyncio.gather(
+                *(self._flush_acks(url) for url in list(self.acks)),
+                return_exceptions=True
+            )
+    
+    async def _flush_acks(self, codespace_url: str):
+        """Envía en una sola request los acks pendientes de un Codespace"""
+        acks = self.acks.pop(codespace_url, None)
+        if not acks or not self.session:
+            return
+        
+        if codespace_url in self.sin_batch:
+            for ack in acks:
+                await self._send_single_ack(codespace_url, ack)
+            return
+        
         try:
-            url = f"{codespace_url}/discord/events/{event_id}/processed"
-            async with self.session.post(url) as response:
-                if response.status != 200:
-                    logger.warning(f"⚠️  Error marcando evento #{event_id} como procesado")
+            url = f"{codespace_url}/discord/events/ack"
+            async with self.session.post(url, json={'acks': acks}) as response:
+                if response.status == 200:
+                    self.stats['acks_batch'] += len(acks)
+                    return
+                
+                if response.status in (404, 405):
+                    logger.info(f"ℹ️  {codespace_url} no soporta acks en lote, usando acks individuales")
+                    self.sin_batch.add(codespace_url)
+                    for ack in acks:
+                        await self._send_single_ack(codespace_url, ack)
+                    return
+                
+                logger.warning(f"⚠️  HTTP {response.status} enviando {len(acks)} ack(s) a {codespace_url}")
         except Exception as e:
-            logger.error(f"❌ Error marcando procesado #{event_id}: {e}")
+            logger.error(f"❌ Error enviando acks a {codespace_url}: {e}")
+        
+        # Reintentar en el próximo ciclo (acotado: el Codespace re-sirve lo que no se confirmó)
+        pendientes = self.acks.setdefault(codespace_url, [])
+        pendientes[:0] = acks
+        del pendientes[ACK_BATCH_MAX * 20:]
     
-    async def _mark_failed(self, event_id: int, codespace_url: str, error_message: str):
-        """Marca un evento como fallido"""
+    async def _send_single_ack(self, codespace_url: str, ack: Dict):
+        """Ack individual para Codespaces sin endpoint de lote"""
+        event_id = ack['id']
         try:
-            url = f"{codespace_url}/discord/events/{event_id}/failed"
-            async with self.session.post(url, json={'error_message': error_message}) as response:
-                if response.status != 200:
-                    logger.warning(f"⚠️  Error marcando evento #{event_id} como fallido")
+            if ack['status'] == 'processed':
+                url = f"{codespace_url}/discord/events/{event_id}/processed"
+                async with self.session.post(url) as response:
+                    if response.status != 200:
+                        logger.warning(f"⚠️  Error marcando evento #{event_id} como procesado")
+            else:
+                url = f"{codespace_url}/discord/events/{event_id}/failed"
+                async with self.session.post(url, json={'error_message': ack.get('error_message')}) as response:
+                    if response.status != 200:
+                        logger.warning(f"⚠️  Error marcando evento #{event_id} como fallido")
+            self.stats['acks_individuales'] += 1
         except Exception as e:
-            logger.error(f"❌ Error marcando fallido #{event_id}: {e}")
+            logger.error(f"❌ Error marcando evento #{event_id}: {e}")
     
     def get_stats(self) -> Dict:
         """Retorna estadísticas del consumer"""
-        return self.stats.copy()
+        stats = self.stats.copy()
+        stats['en_cola'] = self.workers.pending
+        stats['duplicados'] = self.entregados.stats['duplicados']
+        stats['salud'] = self.salud.get_stats()
+        return stats
 
 
 class AddonIntegration(commands.Cog):
@@ -366,6 +688,38 @@ class AddonIntegration(commands.Cog):
             value=str(stats['total_failed']),
             inline=True
         )
+        embed.add_field(
+            name="📡 Vía Streaming",
+            value=f"{stats['total_streamed']} ({len(self.consumer.streams)} stream(s) activo(s))",
+            inline=True
+        )
+        embed.add_field(
+            name="⏳ En Cola",
+            value=str(stats['en_cola']),
+            inline=True
+        )
+        embed.add_field(
+            name="🔁 Duplicados Omitidos",
+            value=str(stats['duplicados']),
+            inline=True
+        )
+        salud = stats['salud']
+        embed.add_field(
+            name="🩺 Endpoints Caídos",
+            value=f"{salud['en_espera']} en espera • {salud['en_cuarentena']} en cuarentena",
+            inline=True
+        )
+        
+        resolver = self.consumer.resolver
+        aciertos = []
+        for tipo, nombre in (('usuario', 'Usuarios'), ('dm', 'DMs'), ('canal', 'Canales')):
+            tasa = resolver.tasa_aciertos(tipo)
+            aciertos.append(f"{nombre}: {tasa:.0%}" if tasa is not None else f"{nombre}: —")
+        embed.add_field(
+            name="🗂️ Caché de Discord (sin REST)",
+            value=" • ".join(aciertos),
+            inline=False
+        )
         
         if stats['last_poll']:
             try:
@@ -4,6 +4,13 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 from utils.database import get_db
+from utils.tunnel_ready import esperar_tunnel, marca_tiempo
+from utils.progreso import MensajeProgreso
+
+TUNNEL_TIMEOUT = 180
+# Si el Codespace ya estaba encendido el startup.sh no vuelve a correr y el
+# webhook del tunnel no llega: solo se espera por si está reiniciando
+TUNNEL_TIMEOUT_ENCENDIDO = 15
 
 class CodespaceControl(commands.Cog):
     def __init__(self, bot):
@@ -47,13 +54,22 @@ class CodespaceControl(commands.Cog):
                 color=discord.Color.yellow()
             )
             msg = await interaction.followup.send(embed=embed_starting)
+            progreso = MensajeProgreso(msg)
             
             headers = {
                 "Authorization": f"Bearer {github_token}",
                 "Accept": "application/vnd.github+json"
             }
             
+            inicio = marca_tiempo()
+            
             async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"https://api.github.com/user/codespaces/{codespace_name}",
+                    headers=headers
+                ) as resp:
+                    estado = (await resp.json()).get("state") if resp.status == 200 else None
+                
                 async with session.post(
                     f"https://api.github.com/user/codespaces/{codespace_name}/start",
                     headers=headers
@@ -61,10 +77,21 @@ class CodespaceControl(commands.Cog):
                     if resp.status not in [200, 202]:
                         raise Exception(f"Error iniciando Codespace: {resp.status}")
             
-            await asyncio.sleep(60)
+            embed_starting.description = (
+                f"**Codespace:** `{codespace_name}`\n\n"
+                "✅ GitHub aceptó el inicio.\n"
+                "⏳ Esperando que el tunnel avise que está listo..."
+            )
+            progreso.actualizar(embed_starting)
+            
+            timeout = TUNNEL_TIMEOUT_ENCENDIDO if estado == "Available" else TUNNEL_TIMEOUT
+            tunnel = await esperar_tunnel(user_id, codespace_name, timeout=timeout, desde=inicio)
             
-            sesion_updated = db.get_sesion(user_id)
-            tunnel_url = sesion_updated.get("tunnel_url")
+            if tunnel:
+                tunnel_url = tunnel.get("tunnel_url")
+            else:
+                sesion_updated = db.get_sesion(user_id)
+                tunnel_url = sesion_updated.get("tunnel_url")
             
             if tunnel_url:
                 embed_success = discord.Embed(
@@ -88,7 +115,7 @@ class CodespaceControl(commands.Cog):
                     color=discord.Color.orange()
                 )
             
-            await msg.edit(embed=embed_success)
+            await progreso.finalizar(embed_success)
             
         except Exception as e:
             embed_error = discord.Embed(
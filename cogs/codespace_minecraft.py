@@ -1,8 +1,10 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 import asyncio
 import aiohttp
+import random
+import time
 from datetime import datetime
 from typing import Optional
 
@@ -15,7 +17,17 @@ from utils.embed_factory import (
     crear_embed_warning,
 )
 from utils.notify import enviar_log_al_propietario
+from utils.tunnel_ready import primer_tunnel, marca_tiempo
+from utils.minecraft_ping import MinecraftPingError
+from utils.minecraft_cache import get_status_cache, ERRORES_SONDEO
+from utils.player_stats import get_player_stats
+from utils.monitor_scheduler import AdaptiveCadence, MonitorScheduler
+from utils.target_registry import get_target_registry
+from utils.entregas import CANAL
+from utils.despachador import get_despachador
+from utils.progreso import MensajeProgreso
 from utils.jsondb import safe_load, safe_save
+from utils.database import get_db
 from config import SESIONES_FILE
 
 
@@ -24,69 +36,117 @@ class CodespaceMinecraftCog(commands.Cog):
         self.bot = bot
         self.monitoreando = {}
         self.ultimo_estado = {}
-        self.monitor_loop.start()
+        self.cadencias = {}
+        self.scheduler = MonitorScheduler(self.monitorear_servidor, interval=60, max_concurrent=50)
 
-    def cog_unload(self):
-        self.monitor_loop.cancel()
+    async def cog_load(self):
+        self.scheduler.start()
+        self.restaurar_monitoreo()
 
-    @tasks.loop(minutes=1)
-    async def monitor_loop(self):
-        """Loop de monitoreo de servidores de Minecraft"""
-        for user_id, data in list(self.monitoreando.items()):
-            try:
-                ip = data.get("ip")
-                channel_id = data.get("channel_id")
-                
-                if not ip or not channel_id:
-                    continue
-                
-                online = await self.verificar_servidor_minecraft(ip)
-                estado_anterior = self.ultimo_estado.get(user_id, False)
-                
-                if online != estado_anterior:
-                    channel = self.bot.get_channel(channel_id)
-                    if channel:
-                        if online:
-                            embed = crear_embed_exito(
-                                "🟢 Servidor Online",
-                                f"**IP:** `{ip}`\n\nEl servidor de Minecraft está ahora **ONLINE** y aceptando conexiones.",
-                                footer="Monitoreando cada 1 minuto"
-                            )
-                        else:
-                            embed = crear_embed_warning(
-                                "🔴 Servidor Offline",
-                                f"**IP:** `{ip}`\n\nEl servidor de Minecraft está ahora **OFFLINE**.",
-                                footer="Monitoreando cada 1 minuto"
-                            )
-                        
-                        await channel.send(embed=embed)
-                    
-                    self.ultimo_estado[user_id] = online
-                    
-            except Exception as e:
-                print(f"Error monitoreando servidor para {user_id}: {e}")
-
-    @monitor_loop.before_loop
-    async def before_monitor_loop(self):
-        await self.bot.wait_until_ready()
+    def restaurar_monitoreo(self):
+        """
+        Recupera los servidores monitoreados antes del reinicio.
+        Los primeros sondeos se reparten en un intervalo para no sondear todo a la vez.
+        """
+        try:
+            monitores = get_db().get_monitores_minecraft()
+        except Exception as e:
+            print(f"⚠️ No se pudo restaurar el monitoreo de Minecraft: {e}")
+            return
+        
+        for user_id, data in monitores.items():
+            self.monitoreando[user_id] = {
+                "ip": data["ip"],
+                "channel_id": data["channel_id"]
+            }
+            self.ultimo_estado[user_id] = data["ultimo_estado"]
+            self.cadencias[user_id] = AdaptiveCadence(estado=data["ultimo_estado"], estables=3)
+            self.scheduler.add(user_id, delay=random.uniform(0, self.scheduler.interval))
+        
+        if monitores:
+            print(f"✅ Monitoreo restaurado para {len(monitores)} servidor(es) de Minecraft")
 
-    async def verificar_servidor_minecraft(self, ip: str) -> bool:
-        """Verifica si un servidor de Minecraft está online usando mcstatus.io"""
+    def guardar_monitoreo(self, user_id: str):
+        """Guarda el estado de un servidor monitoreado (solo se llama cuando cambia)"""
         try:
-            if ":" in ip:
-                host, port = ip.split(":", 1)
+            db = get_db()
+            data = self.monitoreando.get(user_id)
+            if data:
+                db.save_monitor_minecraft(
+                    user_id,
+                    data["ip"],
+                    data["channel_id"],
+                    self.ultimo_estado.get(user_id, False)
+                )
             else:
-                host = ip
-                port = "25565"
-            
-            url = f"https://api.mcstatus.io/v2/status/java/{host}:{port}"
+                db.delete_monitor_minecraft(user_id)
+        except Exception as e:
+            print(f"⚠️ Error guardando monitoreo de {user_id}: {e}")
+
+    async def cog_unload(self):
+        await self.scheduler.stop()
+
+    async def monitorear_servidor(self, user_id: str) -> Optional[float]:
+        """
+        Sondea un servidor monitoreado y avisa si cambió de estado.
+        Retorna el intervalo hasta el próximo sondeo.
+        """
+        await self.bot.wait_until_ready()
+        
+        data = self.monitoreando.get(user_id)
+        if not data:
+            self.scheduler.remove(user_id)
+            return None
+        
+        ip = data.get("ip")
+        channel_id = data.get("channel_id")
+        
+        if not ip or not channel_id:
+            return None
+        
+        cadencia = self.cadencias.get(user_id)
+        if cadencia is None:
+            cadencia = AdaptiveCadence(estado=self.ultimo_estado.get(user_id, False))
+            self.cadencias[user_id] = cadencia
+        
+        online = await self.verificar_servidor_minecraft(ip)
+        
+        if cadencia.registrar(online) and user_id in self.monitoreando:
+            if self.bot.get_channel(channel_id):
+                if online:
+                    embed = crear_embed_exito(
+                        "🟢 Servidor Online",
+                        f"**IP:** `{ip}`\n\nEl servidor de Minecraft está ahora **ONLINE** y aceptando conexiones.",
+                        footer="Monitoreo adaptativo (20s - 5min)"
+                    )
+                else:
+                    embed = crear_embed_warning(
+                        "🔴 Servidor Offline",
+                        f"**IP:** `{ip}`\n\nEl servidor de Minecraft está ahora **OFFLINE**.",
+                        footer="Monitoreo adaptativo (20s - 5min)"
+                    )
+                
+                await get_despachador().enviar(
+                    CANAL, channel_id, embed=embed, origen="minecraft_monitor", user_id=user_id
+                )
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        return data.get("online", False)
-                    return False
+            self.ultimo_estado[user_id] = online
+            self.guardar_monitoreo(user_id)
+        
+        return cadencia.intervalo
+
+    async def verificar_servidor_minecraft(self, ip: str) -> bool:
+        """Verifica si un servidor de Minecraft está online con Server List Ping"""
+        try:
+            data, _ = await get_status_cache().consultar(ip)
+            online = data.get("online", False)
+            get_player_stats().registrar(ip, online, data.get("players", {}).get("online", 0))
+            return online
+        except ValueError:
+            return False
+        except ERRORES_SONDEO:
+            get_player_stats().registrar(ip, False)
+            return False
         except Exception as e:
             print(f"Error verificando servidor {ip}: {e}")
             return False
@@ -143,6 +203,24 @@ class CodespaceMinecraftCog(commands.Cog):
             print(f"Error obteniendo IP: {e}")
             return None
 
+    async def esperar_ip_servidor(self, codespace_url: str, auth_token: str = None,
+                                  timeout: float = 30, intervalo: float = 3) -> Optional[str]:
+        """
+        Espera hasta `timeout` a que el Codespace informe la IP y el servidor
+        de Minecraft responda al ping. Si no termina de arrancar a tiempo
+        retorna igual la IP (el monitoreo avisará cuando esté online).
+        """
+        limite = time.monotonic() + timeout
+        ip = None
+        while True:
+            if ip is None:
+                ip = await self.obtener_ip_desde_webhook(codespace_url, auth_token)
+            if ip and await self.verificar_servidor_minecraft(ip):
+                return ip
+            if time.monotonic() + intervalo > limite:
+                return ip
+            await asyncio.sleep(intervalo)
+
     async def esperar_servidor_web(self, codespace_url: str, max_intentos: int = 40) -> bool:
         """Espera a que el servidor web del Codespace esté disponible"""
         for intento in range(max_intentos):
@@ -211,6 +289,7 @@ class CodespaceMinecraftCog(commands.Cog):
 
         await interaction.response.defer()
 
+        inicio = marca_tiempo()
         token = sesion["token"]
         
         # Obtener URLs guardadas
@@ -245,6 +324,7 @@ class CodespaceMinecraftCog(commands.Cog):
             footer="Ten paciencia, estamos iniciando la VM completa"
         )
         msg = await interaction.followup.send(embed=embed)
+        progreso = MensajeProgreso(msg)
 
         print(f"🚀 [Minecraft Start] Fase 1: Despertando Codespace '{codespace}'")
         
@@ -276,7 +356,7 @@ class CodespaceMinecraftCog(commands.Cog):
                     "3. Intenta de nuevo"
                 )
             )
-            await msg.edit(embed=embed)
+            await progreso.finalizar(embed)
             return
 
         print(f"✅ [Minecraft Start] Fase 1 completa: {mensaje}")
@@ -296,7 +376,7 @@ class CodespaceMinecraftCog(commands.Cog):
             ),
             footer="Esperando que auto_webserver_setup inicie el túnel"
         )
-        await msg.edit(embed=embed)
+        progreso.actualizar(embed)
 
         print(f"🔍 [Minecraft Start] Fase 2: Detectando Cloudflare Tunnel...")
         
@@ -313,16 +393,22 @@ class CodespaceMinecraftCog(commands.Cog):
         if not codespace_url:
             print(f"🔍 [Minecraft Start] Detectando nuevo Cloudflare Tunnel desde URL nativa...")
             
-            # Esperar un poco para que el Codespace inicie auto_webserver_setup
-            await asyncio.sleep(10)
-            
-            nuevo_tunnel = await self.obtener_tunnel_url(codespace_url_nativa, max_intentos=20)
+            # La notificación del túnel (webhook) y el polling de /get_url
+            # corren a la vez; gana el primero que dé una URL
+            nuevo_tunnel = await primer_tunnel(
+                owner_id,
+                codespace,
+                self.obtener_tunnel_url(codespace_url_nativa, max_intentos=20),
+                timeout=60,
+                desde=inicio
+            )
             
             if nuevo_tunnel:
                 codespace_url = nuevo_tunnel
                 # Guardar el nuevo tunnel
                 sesiones[str(owner_id)]["tunnel_url"] = nuevo_tunnel
                 safe_save(SESIONES_FILE, sesiones)
+                get_target_registry().actualizar(owner_id, sesiones[str(owner_id)])
                 print(f"✅ [Minecraft Start] Nuevo Cloudflare Tunnel detectado: {nuevo_tunnel}")
         
         # Si no se detectó ningún tunnel
@@ -354,7 +440,7 @@ class CodespaceMinecraftCog(commands.Cog):
                 ),
                 footer="El túnel es necesario por limitaciones de GitHub Codespaces"
             )
-            await msg.edit(embed=embed)
+            await progreso.finalizar(embed)
             return
         
         print(f"✅ [Minecraft Start] Usando Cloudflare Tunnel: {codespace_url}")
@@ -371,7 +457,7 @@ class CodespaceMinecraftCog(commands.Cog):
             ),
             footer="El túnel bypasea el problema del puerto privado"
         )
-        await msg.edit(embed=embed)
+        progreso.actualizar(embed)
 
         print(f"🔄 [Minecraft Start] Fase 3: Esperando servidor web en {codespace_url}")
         
@@ -395,7 +481,7 @@ class CodespaceMinecraftCog(commands.Cog):
                     "4. Intenta `/minecraft_start` nuevamente"
                 )
             )
-            await msg.edit(embed=embed)
+            await progreso.finalizar(embed)
             return
 
         print(f"✅ [Minecraft Start] Fase 3 completa: Servidor web respondiendo")
@@ -421,7 +507,7 @@ class CodespaceMinecraftCog(commands.Cog):
                     "Verifica que el servidor web esté configurado correctamente."
                 )
             )
-            await msg.edit(embed=embed)
+            await progreso.finalizar(embed)
             return
 
         embed = crear_embed_info(
@@ -438,7 +524,7 @@ class CodespaceMinecraftCog(commands.Cog):
             ),
             footer="Último paso - espera ~1 minuto"
         )
-        await msg.edit(embed=embed)
+        progreso.actualizar(embed)
 
         print(f"🎮 [Minecraft Start] Fase 5: Iniciando Minecraft...")
         
@@ -456,7 +542,7 @@ class CodespaceMinecraftCog(commands.Cog):
                     "Verifica los logs en tu Codespace."
                 )
             )
-            await msg.edit(embed=embed)
+            await progreso.finalizar(embed)
             return
 
         print(f"✅ [Minecraft Start] Fase 5 completa: Minecraft iniciado")
@@ -465,9 +551,8 @@ class CodespaceMinecraftCog(commands.Cog):
         # PASO 6: OBTENER IP Y CONFIGURAR MONITOREO
         # ============================================================
         print(f"🔍 [Minecraft Start] Fase 6: Obteniendo IP del servidor...")
-        await asyncio.sleep(30)
-
-        ip = await self.obtener_ip_desde_webhook(codespace_url, auth_token)
+        # El servidor recién se está iniciando: se sondea hasta que responda
+        ip = await self.esperar_ip_servidor(codespace_url, auth_token, timeout=30)
 
         if not ip:
             data = resultado.get("data", {})
@@ -480,6 +565,9 @@ class CodespaceMinecraftCog(commands.Cog):
                 "channel_id": interaction.channel_id
             }
             self.ultimo_estado[str(owner_id)] = False
+            self.cadencias.pop(str(owner_id), None)
+            self.scheduler.add(str(owner_id))
+            self.guardar_monitoreo(str(owner_id))
 
             conexion_info = "🌐 Cloudflare Tunnel" if 'trycloudflare.com' in codespace_url else "🔗 Codespace Nativo"
 
@@ -520,7 +608,7 @@ class CodespaceMinecraftCog(commands.Cog):
             )
             print(f"⚠️ [Minecraft Start] COMPLETADO pero sin IP detectada")
 
-        await msg.edit(embed=embed)
+        await progreso.finalizar(embed)
         await enviar_log_al_propietario(
             self.bot,
             codespace,
@@ -553,6 +641,9 @@ class CodespaceMinecraftCog(commands.Cog):
             ip = self.monitoreando[str(owner_id)].get("ip", "Desconocido")
             del self.monitoreando[str(owner_id)]
             self.ultimo_estado.pop(str(owner_id), None)
+            self.cadencias.pop(str(owner_id), None)
+            self.scheduler.remove(str(owner_id))
+            self.guardar_monitoreo(str(owner_id))
             
             embed = crear_embed_exito(
                 "✅ Monitoreo Detenido",
@@ -582,25 +673,20 @@ class CodespaceMinecraftCog(commands.Cog):
         await interaction.response.defer()
 
         try:
-            if ":" in ip:
-                host, port = ip.split(":", 1)
-            else:
-                host = ip
-                port = "25565"
-            
-            url = f"https://api.mcstatus.io/v2/status/java/{host}:{port}"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as resp:
-                    if resp.status != 200:
-                        embed = crear_embed_error(
-                            "❌ Error",
-                            f"No se pudo consultar el servidor `{ip}`"
-                        )
-                        await interaction.followup.send(embed=embed)
-                        return
-                    
-                    data = await resp.json()
+            try:
+                data, edad = await get_status_cache().consultar(ip)
+            except ValueError as e:
+                embed = crear_embed_error(
+                    "❌ Error",
+                    f"No se pudo consultar el servidor `{ip}`\n\n{e}"
+                )
+                await interaction.followup.send(embed=embed)
+                return
+            except asyncio.TimeoutError:
+                # Desde Python 3.11 es subclase de OSError; lo reporta el except de abajo
+                raise
+            except (OSError, MinecraftPingError):
+                data, edad = {"online": False}, None
             
             online = data.get("online", False)
             
@@ -614,8 +700,8 @@ class CodespaceMinecraftCog(commands.Cog):
             
             players_online = data.get("players", {}).get("online", 0)
             players_max = data.get("players", {}).get("max", 0)
-            version = data.get("version", {}).get("name_clean", "Desconocido")
-            motd = data.get("motd", {}).get("clean", "Sin descripción")
+            version = data.get("version", {}).get("name") or "Desconocido"
+            motd = data.get("motd") or "Sin descripción"
             
             embed = crear_embed_exito(
                 "🟢 Servidor Online",
@@ -628,7 +714,7 @@ class CodespaceMinecraftCog(commands.Cog):
                 inline=True
             )
             
-            if "latency" in data:
+            if data.get("latency") is not None:
                 latency = data["latency"]
                 embed.add_field(
                     name="📡 Latencia",
@@ -636,10 +722,8 @@ class CodespaceMinecraftCog(commands.Cog):
                     inline=True
                 )
             
-            embed.set_footer(text="Powered by mcstatus.io")
-            
-            if data.get("icon"):
-                embed.set_thumbnail(url=data["icon"])
+            frescura = "en vivo" if edad < 1 else f"en caché, hace {int(edad)}s"
+            embed.set_footer(text=f"Server List Ping • {frescura}")
             
             await interaction.followup.send(embed=embed)
             
@@ -656,6 +740,61 @@ class CodespaceMinecraftCog(commands.Cog):
             )
             await interaction.followup.send(embed=embed)
 
+    @app_commands.command(
+        name="minecraft_stats",
+        description="Estadísticas de jugadores y uptime de un servidor monitoreado"
+    )
+    @app_commands.describe(
+        ip="IP del servidor (ej: mc.hypixel.net)",
+        rango="Periodo a resumir"
+    )
+    @app_commands.choices(rango=[
+        app_commands.Choice(name="Última hora", value=3600),
+        app_commands.Choice(name="Últimas 24 horas", value=86400),
+        app_commands.Choice(name="Últimos 7 días", value=7 * 86400),
+        app_commands.Choice(name="Últimos 30 días", value=30 * 86400),
+    ])
+    async def minecraft_stats(
+        self,
+        interaction: discord.Interaction,
+        ip: str,
+        rango: app_commands.Choice[int] = None
+    ):
+        segundos = rango.value if rango else 86400
+        nombre_rango = rango.name if rango else "Últimas 24 horas"
+        
+        try:
+            resumen = get_player_stats().resumen(ip, segundos)
+        except ValueError as e:
+            embed = crear_embed_error("❌ Error", f"Dirección inválida `{ip}`\n\n{e}")
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        if not resumen:
+            embed = crear_embed_info(
+                "📊 Sin Datos",
+                (
+                    f"**IP:** `{ip}`\n\n"
+                    "No hay muestras para este servidor en el periodo.\n"
+                    "Las estadísticas se registran mientras el servidor está monitoreado."
+                )
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        embed = crear_embed_info(
+            "📊 Estadísticas del Servidor",
+            f"**IP:** `{ip}`\n**Periodo:** {nombre_rango}"
+        )
+        embed.add_field(name="👥 Pico", value=str(resumen["pico"]), inline=True)
+        embed.add_field(name="📈 Promedio", value=f"{resumen['promedio']:.1f}", inline=True)
+        embed.add_field(name="🟢 Uptime", value=f"{resumen['uptime'] * 100:.1f}%", inline=True)
+        
+        resolucion = {60: "1 minuto", 3600: "1 hora", 86400: "1 día"}.get(resumen["resolucion"], f"{resumen['resolucion']}s")
+        embed.set_footer(text=f"{resumen['muestras']} muestras • resolución {resolucion}")
+        
+        await interaction.response.send_message(embed=embed)
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(CodespaceMinecraftCog(bot))
\ No newline at end of file
@@ -1,27 +1,46 @@
 import discord
+import json
+from typing import Optional
 from discord import app_commands
 from discord.ext import commands
 from utils.database import get_db
+from utils.entregas import get_entregas, DM
+from utils.despachador import get_despachador, RESUMEN_MINUTOS_POR_DEFECTO
 
 class NotificacionesCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.entregas = get_entregas()
+        self.despachador = get_despachador()
+    
+    async def cog_load(self):
+        self.entregas.configurar(self.bot)
+        self.despachador.configurar(self.bot)
+        await self.despachador.restaurar()
+        self.entregas.start()
+    
+    async def cog_unload(self):
+        await self.despachador.stop()
+        await self.entregas.stop()
     
     @app_commands.command(name="notificaciones")
     @app_commands.describe(
-        modo="Dónde recibir notificaciones del tunnel",
-        canal="Canal específico (solo si modo es 'canal')"
+        modo="Dónde recibir notificaciones (tunnel, backups, estado del Codespace)",
+        canal="Canal específico (solo si modo es 'canal')",
+        minutos="Cada cuántos minutos enviar el resumen (solo si modo es 'resumen')"
     )
     @app_commands.choices(modo=[
         app_commands.Choice(name="🔕 Desactivadas", value="disabled"),
         app_commands.Choice(name="💬 DM Privado", value="dm"),
-        app_commands.Choice(name="📢 Canal de Discord", value="channel")
+        app_commands.Choice(name="📢 Canal de Discord", value="channel"),
+        app_commands.Choice(name="📬 Resumen Periódico por DM", value="digest")
     ])
     async def configurar_notificaciones(
         self,
         interaction: discord.Interaction,
         modo: app_commands.Choice[str],
-        canal: discord.TextChannel = None
+        canal: discord.TextChannel = None,
+        minutos: app_commands.Range[int, 5, 1440] = RESUMEN_MINUTOS_POR_DEFECTO
     ):
         await interaction.response.defer(ephemeral=True)
         
@@ -54,11 +73,7 @@ class NotificacionesCog(commands.Cog):
                 )
                 return
             
-            sesion["notification_mode"] = "channel"
-            sesion["notification_channel_id"] = str(canal.id)
-            sesion["notification_guild_id"] = str(interaction.guild.id)
-            
-            db.save_sesion(user_id, sesion)
+            db.save_notificaciones(user_id, "channel", str(canal.id), str(interaction.guild.id))
             
             embed = discord.Embed(
                 title="✅ Notificaciones Configuradas",
@@ -71,11 +86,12 @@ class NotificacionesCog(commands.Cog):
             test_embed = discord.Embed(
                 title="🔔 Notificaciones Activadas",
                 description=(
-                    f"{interaction.user.mention} recibirá aquí las notificaciones de tunnel.\n\n"
+                    f"{interaction.user.mention} recibirá aquí las notificaciones de su Codespace.\n\n"
                     "Esto incluye:\n"
                     "• Cuando el tunnel de Cloudflare esté listo\n"
                     "• IP del servidor Minecraft\n"
-                    "• IP de VoiceChat (si aplica)"
+                    "• IP de VoiceChat (si aplica)\n"
+                    "• Backups y cambios de estado del Codespace"
                 ),
                 color=discord.Color.blue()
             )
@@ -84,11 +100,7 @@ class NotificacionesCog(commands.Cog):
             await canal.send(embed=test_embed)
         
         elif modo_valor == "dm":
-            sesion["notification_mode"] = "dm"
-            sesion["notification_channel_id"] = None
-            sesion["notification_guild_id"] = None
-            
-            db.save_sesion(user_id, sesion)
+            db.save_notificaciones(user_id, "dm")
             
             embed = discord.Embed(
                 title="✅ Notificaciones Configuradas",
@@ -99,11 +111,7 @@ class NotificacionesCog(commands.Cog):
             await interaction.followup.send(embed=embed, ephemeral=True)
         
         elif modo_valor == "disabled":
-            sesion["notification_mode"] = "disabled"
-            sesion["notification_channel_id"] = None
-            sesion["notification_guild_id"] = None
-            
-            db.save_sesion(user_id, sesion)
+            db.save_notificaciones(user_id, "disabled")
             
             embed = discord.Embed(
                 title="🔕 Notificaciones Desactivadas",
@@ -117,6 +125,20 @@ class NotificacionesCog(commands.Cog):
             )
             
             await interaction.followup.send(embed=embed, ephemeral=True)
+        
+        elif modo_valor == "digest":
+            db.save_notificaciones(user_id, "digest", digest_minutes=minutos)
+            
+            embed = discord.Embed(
+                title="📬 Resumen Periódico Activado",
+                description=(
+                    f"Recibirás **un DM cada {minutos} minutos** con el resumen de tus avisos.\n\n"
+                    "Los avisos del tunnel y los errores de backup se siguen enviando al momento."
+                ),
+                color=discord.Color.green()
+            )
+            
+            await interaction.followup.send(embed=embed, ephemeral=True)
     
     @app_commands.command(name="ver_notificaciones")
     async def ver_configuracion_notificaciones(self, interaction: discord.Interaction):
@@ -151,6 +173,10 @@ class NotificacionesCog(commands.Cog):
             else:
                 modo_texto = "⚠️ No configurado"
                 descripcion = "Modo canal seleccionado pero sin canal específico"
+        elif notification_mode == "digest":
+            minutos = sesion.get("notification_digest_minutes") or RESUMEN_MINUTOS_POR_DEFECTO
+            modo_texto = f"📬 Resumen cada {minutos} min"
+            descripcion = "Recibes un DM periódico con el resumen de tus avisos (tunnel y errores al momento)"
         else:
             modo_texto = "💬 DM Privado (predeterminado)"
             descripcion = "Recibes notificaciones por mensaje privado"
@@ -179,6 +205,78 @@ class NotificacionesCog(commands.Cog):
         )
         
         await interaction.followup.send(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="entregas_fallidas")
+    async def ver_entregas_fallidas(self, interaction: discord.Interaction):
+        """Muestra las notificaciones que no se pudieron entregar"""
+        await interaction.response.defer(ephemeral=True)
+        
+        es_owner = await self.bot.is_owner(interaction.user)
+        user_id = None if es_owner else str(interaction.user.id)
+        
+        try:
+            fallidas = get_db().get_entregas_fallidas(user_id, limite=10)
+        except Exception as e:
+            await interaction.followup.send(f"❌ Error consultando entregas: {e}", ephemeral=True)
+            return
+        
+        if not fallidas:
+            await interaction.followup.send("✅ No hay notificaciones sin entregar.", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="📭 Notificaciones No Entregadas",
+            description="Usa `/reintentar_entrega` para volver a enviarlas.",
+            color=discord.Color.orange()
+        )
+        
+        for fallida in fallidas:
+            mensaje = json.loads(fallida["mensaje"])
+            titulo = next(
+                (e.get("title") for e in mensaje.get("embeds", []) if e.get("title")),
+                (mensaje.get("content") or "Sin contenido")[:60]
+            )
+            destino = "DM" if fallida["destino_tipo"] == DM else f"<#{fallida['destino_id']}>"
+            embed.add_field(
+                name=f"#{fallida['id']} • {titulo}",
+                value=(
+                    f"**Destino:** {destino}\n"
+                    f"**Origen:** `{fallida['origen'] or 'desconocido'}`\n"
+                    f"**Error:** {fallida['error']}\n"
+                    f"**Fecha:** <t:{int(fallida['fallido_at'].timestamp())}:R>"
+                ),
+                inline=False
+            )
+        
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="reintentar_entrega")
+    @app_commands.describe(entrega_id="Número de la entrega (vacío = todas las tuyas)")
+    async def reintentar_entrega(self, interaction: discord.Interaction, entrega_id: Optional[int] = None):
+        """Vuelve a encolar notificaciones no entregadas"""
+        await interaction.response.defer(ephemeral=True)
+        
+        es_owner = await self.bot.is_owner(interaction.user)
+        user_id = None if es_owner else str(interaction.user.id)
+        
+        try:
+            db = get_db()
+            fallidas = db.get_entregas_fallidas(user_id, limite=100)
+            ids = [f["id"] for f in fallidas if entrega_id is None or f["id"] == entrega_id]
+            
+            if not ids:
+                await interaction.followup.send("❌ No se encontró esa entrega.", ephemeral=True)
+                return
+            
+            movidas = db.reintentar_entregas_fallidas(ids)
+        except Exception as e:
+            await interaction.followup.send(f"❌ Error reintentando entregas: {e}", ephemeral=True)
+            return
+        
+        await interaction.followup.send(
+            f"🔁 {movidas} notificación(es) vuelven a la cola de envío.",
+            ephemeral=True
+        )
 
 async def setup(bot):
     await bot.add_cog(NotificacionesCog(bot))
\ No newline at end of file
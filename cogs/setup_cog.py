@@ -6,7 +6,9 @@ import base64
 import json
 from datetime import datetime
 from utils.database import get_db
-from config import RENDER_EXTERNAL_URL
+from utils.progreso import MensajeProgreso
+from utils.firma_webhook import clave_usuario, CABECERA_TIMESTAMP, CABECERA_FIRMA
+from config import RENDER_EXTERNAL_URL, WEBHOOK_SECRET
 
 class SetupCog(commands.Cog):
     def __init__(self, bot):
@@ -78,24 +80,30 @@ class SetupCog(commands.Cog):
             
             db.save_vinculacion(user_id, github_username)
             
+            datos_config = (
+                f"**GitHub:** `{github_username}`\n"
+                f"**Repositorio:** `{repo_full_name}`\n"
+                f"**Codespace:** `{codespace_name}`\n\n"
+            )
             embed_config = discord.Embed(
                 title="⚙️ Configurando Codespace Automáticamente...",
-                description=(
-                    f"**GitHub:** `{github_username}`\n"
-                    f"**Repositorio:** `{repo_full_name}`\n"
-                    f"**Codespace:** `{codespace_name}`\n\n"
-                    "Creando archivos de configuración..."
-                ),
+                description=datos_config + "Creando archivos de configuración...",
                 color=discord.Color.yellow()
             )
             msg = await interaction.followup.send(embed=embed_config, ephemeral=True)
+            progreso = MensajeProgreso(msg)
             
             needs_devcontainer = await self._check_needs_devcontainer(github_token, repo_full_name)
             
             devcontainer_result = "exists"
             if needs_devcontainer:
+                embed_config.description = datos_config + "📁 Creando `.devcontainer/devcontainer.json`..."
+                progreso.actualizar(embed_config.copy())
                 devcontainer_result = await self._create_devcontainer(github_token, repo_full_name, user_id)
             
+            embed_config.description = datos_config + "📁 Creando `startup.sh`..."
+            progreso.actualizar(embed_config.copy())
+            
             startup_result = await self._create_startup(github_token, repo_full_name, user_id)
             
             sesion = db.get_sesion(user_id)
@@ -145,7 +153,7 @@ class SetupCog(commands.Cog):
             
             embed_done.set_footer(text="💡 Ahora todo se ejecuta automáticamente al iniciar tu Codespace")
             
-            await msg.edit(embed=embed_done)
+            await progreso.finalizar(embed_done)
             
         except Exception as e:
             import traceback
@@ -265,12 +273,16 @@ class SetupCog(commands.Cog):
     async def _create_startup(self, github_token: str, repo_full_name: str, discord_user_id: str) -> bool:
         print(f"📝 Creando startup.sh para {repo_full_name}")
         
+        # Clave propia del usuario para firmar los webhooks (no la maestra)
+        clave_webhook = clave_usuario(discord_user_id) if WEBHOOK_SECRET else ""
+        
         startup_script = f'''#!/bin/bash
 set -e
 
 LOG_FILE="/tmp/codespace_startup.log"
 DISCORD_USER_ID="{discord_user_id}"
 BOT_WEBHOOK_URL="${{BOT_WEBHOOK_URL:-{RENDER_EXTERNAL_URL}/webhook/tunnel_notify}}"
+export BOT_WEBHOOK_KEY="{clave_webhook}"
 
 echo "🚀 [$(date)] Iniciando scripts de startup..." | tee -a "$LOG_FILE"
 
@@ -352,6 +364,9 @@ if [ -f web_server.py ]; then
 import requests
 import json
 import sys
+import time
+import hmac
+import hashlib
 
 try:
     payload = {{
@@ -364,14 +379,30 @@ try:
         'auto_started': True
     }}
     
-    response = requests.post(
-        '$BOT_WEBHOOK_URL',
-        json=payload,
-        timeout=15
-    )
+    body = json.dumps(payload)
+    
+    # 202 = aceptado y encolado; 429/503 = limitado o saturado, reintentar tras Retry-After
+    for intento in range(3):
+        headers = {{'Content-Type': 'application/json'}}
+        if '$BOT_WEBHOOK_KEY':
+            # Firma nueva en cada intento: el bot rechaza firmas repetidas
+            ts = str(int(time.time()))
+            headers['{CABECERA_TIMESTAMP}'] = ts
+            headers['{CABECERA_FIRMA}'] = hmac.new(
+                '$BOT_WEBHOOK_KEY'.encode(), (ts + '.' + body).encode(), hashlib.sha256
+            ).hexdigest()
+        response = requests.post(
+            '$BOT_WEBHOOK_URL',
+            data=body,
+            headers=headers,
+            timeout=15
+        )
+        if response.status_code not in (429, 503):
+            break
+        time.sleep(int(response.headers.get('Retry-After', 5)))
     
     print(response.status_code)
-    sys.exit(0 if response.status_code == 200 else 1)
+    sys.exit(0 if response.status_code in (200, 202) else 1)
 except Exception as e:
     print(f'ERROR: {{e}}', file=sys.stderr)
     sys.exit(1)
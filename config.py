@@ -20,6 +20,13 @@ RENDER_EXTERNAL_URL = os.getenv('RENDER_EXTERNAL_URL', '')
 
 BOT_WEBHOOK_URL = f"{RENDER_EXTERNAL_URL}/webhook/tunnel_notify" if RENDER_EXTERNAL_URL else "http://localhost:10000/webhook/tunnel_notify"
 
+# Clave maestra para firmar webhooks (HMAC por usuario); vacía = sin verificación
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
+# Usar X-Forwarded-For para la IP de origen solo detrás de un proxy propio
+# (Render lo agrega siempre); sin proxy el cliente podría inventarse la IP
+TRUST_PROXY = os.getenv('TRUST_PROXY', 'true' if RENDER_EXTERNAL_URL else 'false').lower() in ('1', 'true', 'yes')
+
 DATA_DIR = 'data'
 LOGS_DIR = 'logs'
 
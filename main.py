@@ -6,7 +6,7 @@ import traceback
 import os
 import json
 from config import DISCORD_BOT_TOKEN, GUILD_ID
-from web.server import run_flask, set_bot
+from web.server import iniciar_servidor_web, set_bot
 from web.auto_ping import self_ping
 from utils.database import get_db
 from datetime import datetime
@@ -156,11 +156,14 @@ async def main():
             print(f"   • {cmd.name}")
         
         set_bot(bot)
-        Thread(target=run_flask, daemon=True).start()
+        web_runner = await iniciar_servidor_web()
         Thread(target=self_ping, daemon=True).start()
         
-        print("\n🔌 Conectando a Discord...")
-        await bot.start(DISCORD_BOT_TOKEN)
+        try:
+            print("\n🔌 Conectando a Discord...")
+            await bot.start(DISCORD_BOT_TOKEN)
+        finally:
+            await web_runner.cleanup()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,63 @@
+import time
+import unittest
+
+from utils.firma_webhook import VerificadorFirmas, clave_usuario, firmar
+
+
+class VerificadorFirmasTest(unittest.TestCase):
+    def setUp(self):
+        self.verificador = VerificadorFirmas(secreto="secreto", ventana=300)
+        self.cuerpo = b'{"user_id": "42"}'
+
+    def _firmar(self, user_id="42", timestamp=None, cuerpo=None):
+        timestamp = timestamp or str(int(time.time()))
+        firma = firmar(clave_usuario(user_id, "secreto"), timestamp, cuerpo or self.cuerpo)
+        return timestamp, firma
+
+    def test_firma_valida(self):
+        timestamp, firma = self._firmar()
+        self.assertIsNone(self.verificador.verificar("42", timestamp, firma, self.cuerpo))
+        self.assertEqual(self.verificador.stats['validas'], 1)
+
+    def test_timestamp_fuera_de_ventana(self):
+        for desfase in (-301, 301):
+            with self.subTest(desfase=desfase):
+                timestamp, firma = self._firmar(timestamp=str(int(time.time()) + desfase))
+                self.assertEqual(
+                    self.verificador.verificar("42", timestamp, firma, self.cuerpo),
+                    "Timestamp fuera de ventana"
+                )
+
+    def test_firma_invalida(self):
+        timestamp, firma = self._firmar()
+        casos = {
+            "otro usuario": ("43", timestamp, firma, self.cuerpo),
+            "cuerpo alterado": ("42", timestamp, firma, b'{"user_id": "43"}'),
+            "firma alterada": ("42", timestamp, "0" * len(firma), self.cuerpo),
+            "otro secreto": ("42", timestamp, firmar(clave_usuario("42", "otro"), timestamp, self.cuerpo), self.cuerpo),
+        }
+        for nombre, args in casos.items():
+            with self.subTest(nombre):
+                self.assertEqual(self.verificador.verificar(*args), "Firma inválida")
+
+    def test_firma_incompleta(self):
+        timestamp, firma = self._firmar()
+        self.assertEqual(self.verificador.verificar("42", None, firma, self.cuerpo), "Firma requerida")
+        self.assertEqual(self.verificador.verificar("42", timestamp, None, self.cuerpo), "Firma requerida")
+        self.assertEqual(self.verificador.verificar("42", "abc", firma, self.cuerpo), "Timestamp inválido")
+
+    def test_firma_repetida(self):
+        timestamp, firma = self._firmar()
+        self.assertIsNone(self.verificador.verificar("42", timestamp, firma, self.cuerpo))
+        self.assertEqual(
+            self.verificador.verificar("42", timestamp, firma, self.cuerpo),
+            "Petición repetida"
+        )
+        self.assertEqual(self.verificador.stats['repetidas'], 1)
+
+    def test_sin_secreto_inactivo(self):
+        self.assertFalse(VerificadorFirmas(secreto="").activo)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import struct
+import unittest
+
+from utils.minecraft_ping import (
+    MinecraftPingError,
+    _leer_paquete,
+    _paquete,
+    _string,
+    consultar_estado_java,
+)
+
+
+class ServidorFalso:
+    """Servidor local que responde el Server List Ping con un estado fijo"""
+
+    def __init__(self, estado):
+        self.estado = estado
+        self.handshake = None
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._atender, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _atender(self, reader, writer):
+        try:
+            _, self.handshake = await _leer_paquete(reader)
+            await _leer_paquete(reader)
+            cuerpo = self.estado if isinstance(self.estado, str) else json.dumps(self.estado)
+            writer.write(_paquete(0x00, _string(cuerpo)))
+            await writer.drain()
+
+            packet_id, payload = await _leer_paquete(reader)
+            if packet_id == 0x01:
+                writer.write(_paquete(0x01, payload))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+
+class ConsultarEstadoJavaTest(unittest.IsolatedAsyncioTestCase):
+    async def test_estado_valido(self):
+        estado = {
+            "version": {"name": "1.20.4", "protocol": 765},
+            "players": {"online": 3, "max": 20, "sample": [{"name": "Steve", "id": "x"}]},
+            "description": {"text": "§aHola ", "extra": [{"text": "mundo"}]},
+        }
+        async with ServidorFalso(estado) as servidor:
+            resultado = await consultar_estado_java("mc.ejemplo.com", servidor.port, ip="127.0.0.1")
+
+        self.assertTrue(resultado["online"])
+        self.assertEqual(resultado["players"], {"online": 3, "max": 20, "sample": ["Steve"]})
+        self.assertEqual(resultado["version"], {"name": "1.20.4", "protocol": 765})
+        self.assertEqual(resultado["motd"], "Hola mundo")
+        self.assertIsNotNone(resultado["latency"])
+        # El handshake lleva el host pedido aunque se conecte a otra IP
+        self.assertIn(b"mc.ejemplo.com", servidor.handshake)
+        self.assertEqual(servidor.handshake[-3:-1], struct.pack(">H", servidor.port))
+
+    async def test_estado_que_no_es_objeto(self):
+        for estado in (["lista"], '"texto"', "42"):
+            with self.subTest(estado=estado):
+                async with ServidorFalso(estado) as servidor:
+                    with self.assertRaises(MinecraftPingError):
+                        await consultar_estado_java("127.0.0.1", servidor.port)
+
+    async def test_json_invalido(self):
+        async with ServidorFalso("{no es json") as servidor:
+            with self.assertRaises(MinecraftPingError):
+                await consultar_estado_java("127.0.0.1", servidor.port)
+
+    async def test_campos_con_tipos_inesperados(self):
+        estado = {"players": "muchos", "version": None, "description": 5}
+        async with ServidorFalso(estado) as servidor:
+            resultado = await consultar_estado_java("127.0.0.1", servidor.port)
+        self.assertEqual(resultado["players"], {"online": 0, "max": 0, "sample": []})
+        self.assertEqual(resultado["motd"], "")
+
+
+if __name__ == "__main__":
+    unittest.main()
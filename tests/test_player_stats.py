@@ -0,0 +1,61 @@
+import unittest
+
+from utils.player_stats import MAX_HUECO, SerieJugadores
+
+# Alineado a la hora para que el rango consultado empiece en un bucket
+T0 = 1_700_000_000 - 1_700_000_000 % 3600
+
+
+class SerieJugadoresTest(unittest.TestCase):
+    def test_uptime_ponderado_con_muestreo_desigual(self):
+        serie = SerieJugadores()
+        # Online con pocas muestras, offline con muchas (cadencia adaptativa)
+        for t in range(0, 3000, 300):
+            serie.agregar(T0 + t, True, 10)
+        for t in range(3000, 3600, 10):
+            serie.agregar(T0 + t, False, 0)
+
+        resumen = serie.resumen(3600, ahora=T0 + 3600)
+
+        self.assertEqual(resumen["muestras"], 70)
+        self.assertAlmostEqual(resumen["uptime"], 3000 / 3600)
+        self.assertAlmostEqual(resumen["promedio"], 10)
+        self.assertEqual(resumen["pico"], 10)
+        self.assertEqual(resumen["resolucion"], 60)
+
+    def test_promedio_ponderado_con_muestreo_desigual(self):
+        serie = SerieJugadores()
+        for t in range(0, 1800, 600):
+            serie.agregar(T0 + t, True, 4)
+        for t in range(1800, 3600, 60):
+            serie.agregar(T0 + t, True, 10)
+
+        resumen = serie.resumen(3600, ahora=T0 + 3600)
+
+        self.assertAlmostEqual(resumen["uptime"], 1.0)
+        self.assertAlmostEqual(resumen["promedio"], (4 * 1800 + 10 * 1800) / 3600)
+
+    def test_hueco_largo_no_se_acredita(self):
+        serie = SerieJugadores()
+        serie.agregar(T0, True, 5)
+        serie.agregar(T0 + 3000, False, 0)
+
+        resumen = serie.resumen(3600, ahora=T0 + 3600)
+
+        # Solo MAX_HUECO online tras la primera muestra y 600s offline tras la segunda
+        self.assertAlmostEqual(resumen["uptime"], MAX_HUECO / (MAX_HUECO + 600))
+
+    def test_rango_largo_usa_nivel_horario(self):
+        serie = SerieJugadores()
+        for t in range(0, 86400, 600):
+            serie.agregar(T0 + t, t < 43200, 3)
+
+        resumen = serie.resumen(86400, ahora=T0 + 86400)
+
+        self.assertEqual(resumen["resolucion"], 3600)
+        self.assertAlmostEqual(resumen["uptime"], 0.5)
+        self.assertAlmostEqual(resumen["promedio"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
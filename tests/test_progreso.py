@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+import discord
+
+from utils.progreso import MensajeProgreso
+
+
+class MensajeFalso:
+    embeds = []
+
+    def __init__(self, demora: float = 0.05):
+        self.demora = demora
+        self.publicados = []
+
+    async def edit(self, embed):
+        await asyncio.sleep(self.demora)
+        self.publicados.append(embed.title)
+
+
+class MensajeProgresoTest(unittest.IsolatedAsyncioTestCase):
+    async def test_actualizacion_durante_edicion_se_publica(self):
+        mensaje = MensajeFalso(demora=0.05)
+        progreso = MensajeProgreso(mensaje, intervalo=0.01)
+
+        progreso.actualizar(discord.Embed(title="fase 1"))
+        await asyncio.sleep(0.03)
+        self.assertTrue(progreso._editando)
+        progreso.actualizar(discord.Embed(title="fase 2"))
+
+        await asyncio.sleep(0.2)
+        self.assertEqual(mensaje.publicados, ["fase 1", "fase 2"])
+
+    async def test_agrupa_actualizaciones_dentro_del_intervalo(self):
+        mensaje = MensajeFalso(demora=0)
+        progreso = MensajeProgreso(mensaje, intervalo=0.05)
+
+        for fase in range(5):
+            progreso.actualizar(discord.Embed(title=f"fase {fase}"))
+        await progreso.finalizar(discord.Embed(title="listo"))
+
+        self.assertEqual(mensaje.publicados, ["listo"])
+        self.assertEqual(progreso.ediciones, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
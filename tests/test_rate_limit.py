@@ -0,0 +1,30 @@
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import make_mocked_request
+
+from web.rate_limit import ip_origen
+
+
+def _peticion(reenviado=None, remota="10.0.0.5"):
+    headers = {"X-Forwarded-For": reenviado} if reenviado else {}
+    transporte = mock.Mock()
+    transporte.get_extra_info.return_value = (remota, 4321)
+    return make_mocked_request("POST", "/webhook/tunnel_notify", headers=headers, transport=transporte)
+
+
+class IpOrigenTest(unittest.TestCase):
+    def test_sin_proxy_ignora_la_cabecera(self):
+        peticion = _peticion("1.2.3.4")
+        self.assertEqual(ip_origen(peticion, confiar_proxy=False), "10.0.0.5")
+
+    def test_con_proxy_usa_la_ultima_ip(self):
+        peticion = _peticion("6.6.6.6, 1.2.3.4")
+        self.assertEqual(ip_origen(peticion, confiar_proxy=True), "1.2.3.4")
+
+    def test_con_proxy_sin_cabecera_usa_la_remota(self):
+        self.assertEqual(ip_origen(_peticion(), confiar_proxy=True), "10.0.0.5")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+
+from utils.tunnel_ready import marca_tiempo, notificar_tunnel, primer_tunnel
+
+
+async def sondeo_lento(url, demora, registro):
+    try:
+        await asyncio.sleep(demora)
+        return url
+    except asyncio.CancelledError:
+        registro.append("cancelado")
+        raise
+
+
+class PrimerTunnelTest(unittest.IsolatedAsyncioTestCase):
+    async def test_gana_el_webhook(self):
+        registro = []
+        inicio = marca_tiempo()
+        asyncio.get_running_loop().call_later(0.05, notificar_tunnel, "1", "cs", {"tunnel_url": "https://webhook"})
+
+        url = await primer_tunnel("1", "cs", sondeo_lento("https://sondeo", 5, registro), timeout=5, desde=inicio)
+
+        self.assertEqual(url, "https://webhook")
+        self.assertEqual(registro, ["cancelado"])
+
+    async def test_gana_el_sondeo_sin_esperar_al_webhook(self):
+        loop = asyncio.get_running_loop()
+        comienzo = loop.time()
+
+        url = await primer_tunnel("2", "cs", sondeo_lento("https://sondeo", 0.05, []), timeout=5, desde=marca_tiempo())
+
+        self.assertEqual(url, "https://sondeo")
+        self.assertLess(loop.time() - comienzo, 1)
+
+    async def test_ninguno_da_url(self):
+        url = await primer_tunnel("3", "cs", sondeo_lento(None, 0.01, []), timeout=0.05, desde=marca_tiempo())
+        self.assertIsNone(url)
+
+
+if __name__ == "__main__":
+    unittest.main()
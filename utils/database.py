@@ -1,13 +1,33 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 from config import DATABASE_URL
 
+# Todas las llamadas comparten una sola conexión de psycopg2, y en psycopg2 la
+# transacción es de la conexión, no del cursor: un commit o rollback desde un
+# hilo cerraría la transacción que otro hilo tiene a medias. Cada método
+# público toma el lock de la conexión durante toda su transacción, y el código
+# async pasa por en_hilo_db, que usa un único hilo para no bloquear el loop.
+
+def _serializado(metodo):
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        with self._lock:
+            return metodo(self, *args, **kwargs)
+    return envoltura
+
 class Database:
     def __init__(self):
         self.conn = None
+        self._lock = threading.RLock()
+        self._oyentes_sesion = []
         self.connect()
     
+    @_serializado
     def connect(self):
         try:
             self.conn = psycopg2.connect(DATABASE_URL, sslmode='require')
@@ -47,6 +67,11 @@ class Database:
                 )
             """)
             
+            cur.execute("""
+                ALTER TABLE sesiones
+                ADD COLUMN IF NOT EXISTS notification_digest_minutes INTEGER DEFAULT 60
+            """)
+            
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS vinculaciones (
                     discord_user_id TEXT PRIMARY KEY,
@@ -64,9 +89,85 @@ class Database:
                 )
             """)
             
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS minecraft_monitoreo (
+                    discord_user_id TEXT PRIMARY KEY,
+                    ip TEXT NOT NULL,
+                    channel_id TEXT NOT NULL,
+                    ultimo_estado BOOLEAN DEFAULT FALSE,
+                    actualizado_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS eventos_entregados (
+                    codespace TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    entregado_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (codespace, event_id)
+                )
+            """)
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS entregas_pendientes (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT,
+                    destino_tipo TEXT NOT NULL,
+                    destino_id TEXT NOT NULL,
+                    mensaje TEXT NOT NULL,
+                    origen TEXT,
+                    intentos INTEGER DEFAULT 0,
+                    ultimo_error TEXT,
+                    proximo_intento TIMESTAMP DEFAULT NOW(),
+                    creado_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS entregas_fallidas (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT,
+                    destino_tipo TEXT NOT NULL,
+                    destino_id TEXT NOT NULL,
+                    mensaje TEXT NOT NULL,
+                    origen TEXT,
+                    intentos INTEGER DEFAULT 0,
+                    error TEXT,
+                    creado_at TIMESTAMP DEFAULT NOW(),
+                    fallido_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS webhook_outbox (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT,
+                    tipo TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    intentos INTEGER DEFAULT 0,
+                    ultimo_error TEXT,
+                    lease_owner TEXT,
+                    lease_hasta TIMESTAMP,
+                    creado_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS resumenes_pendientes (
+                    id SERIAL PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    ts BIGINT NOT NULL,
+                    titulo TEXT NOT NULL,
+                    origen TEXT,
+                    minutos INTEGER NOT NULL,
+                    enviar_en BIGINT NOT NULL
+                )
+            """)
+            
             self.conn.commit()
             print("✅ Tablas inicializadas")
     
+    @_serializado
     def get_sesion(self, user_id: str) -> dict:
         with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM sesiones WHERE discord_user_id = %s", (user_id,))
@@ -80,6 +181,7 @@ class Database:
                 return data
             return None
     
+    @_serializado
     def get_all_sesiones(self) -> dict:
         with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM sesiones")
@@ -95,70 +197,124 @@ class Database:
                 sesiones[user_id] = data
             return sesiones
     
+    def _upsert_sesion(self, cur, user_id: str, data: dict):
+        def parse_timestamp(value):
+            if not value:
+                return None
+            try:
+                if isinstance(value, str):
+                    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+                return value
+            except:
+                return None
+        
+        expira_token = parse_timestamp(data.get("expira_token"))
+        tunnel_actualizado = parse_timestamp(data.get("tunnel_actualizado"))
+        configured_at = parse_timestamp(data.get("configured_at"))
+        vinculado_at = parse_timestamp(data.get("vinculado_at")) or datetime.now()
+        
+        cur.execute("""
+            INSERT INTO sesiones (
+                discord_user_id, github_username, github_id, token,
+                expira_token, codespace, repo_name, repo_full_name,
+                tunnel_url, tunnel_port, tunnel_type, voicechat_address,
+                tunnel_actualizado, auto_configured, devcontainer_created,
+                startup_created, configured_at, vinculado_at, updated_at
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (discord_user_id) DO UPDATE SET
+                github_username = EXCLUDED.github_username,
+                github_id = EXCLUDED.github_id,
+                token = EXCLUDED.token,
+                expira_token = EXCLUDED.expira_token,
+                codespace = EXCLUDED.codespace,
+                repo_name = EXCLUDED.repo_name,
+                repo_full_name = EXCLUDED.repo_full_name,
+                tunnel_url = EXCLUDED.tunnel_url,
+                tunnel_port = EXCLUDED.tunnel_port,
+                tunnel_type = EXCLUDED.tunnel_type,
+                voicechat_address = EXCLUDED.voicechat_address,
+                tunnel_actualizado = EXCLUDED.tunnel_actualizado,
+                auto_configured = EXCLUDED.auto_configured,
+                devcontainer_created = EXCLUDED.devcontainer_created,
+                startup_created = EXCLUDED.startup_created,
+                configured_at = EXCLUDED.configured_at,
+                updated_at = NOW()
+        """, (
+            user_id, data.get("github_username"), data.get("github_id"), data.get("token"),
+            expira_token, data.get("codespace"), data.get("repo_name"), data.get("repo_full_name"),
+            data.get("tunnel_url"), data.get("tunnel_port"), data.get("tunnel_type"),
+            data.get("voicechat_address"), tunnel_actualizado, data.get("auto_configured", False),
+            data.get("devcontainer_created", False), data.get("startup_created", False),
+            configured_at, vinculado_at
+        ))
+    
+    @_serializado
     def save_sesion(self, user_id: str, data: dict):
         with self.conn.cursor() as cur:
-            def parse_timestamp(value):
-                if not value:
-                    return None
-                try:
-                    if isinstance(value, str):
-                        return datetime.fromisoformat(value.replace('Z', '+00:00'))
-                    return value
-                except:
-                    return None
-            
-            expira_token = parse_timestamp(data.get("expira_token"))
-            tunnel_actualizado = parse_timestamp(data.get("tunnel_actualizado"))
-            configured_at = parse_timestamp(data.get("configured_at"))
-            vinculado_at = parse_timestamp(data.get("vinculado_at")) or datetime.now()
-            
+            self._upsert_sesion(cur, user_id, data)
+            self.conn.commit()
+        self._notificar_cambio_sesion(user_id, data)
+    
+    @_serializado
+    def save_sesion_con_outbox(self, user_id: str, data: dict, tipo: str, payload: str) -> int:
+        """Guarda la sesión y encola el webhook en webhook_outbox en la misma transacción"""
+        try:
+            with self.conn.cursor() as cur:
+                self._upsert_sesion(cur, user_id, data)
+                cur.execute("""
+                    INSERT INTO webhook_outbox (user_id, tipo, payload)
+                    VALUES (%s, %s, %s) RETURNING id
+                """, (user_id, tipo, payload))
+                outbox_id = cur.fetchone()[0]
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self._notificar_cambio_sesion(user_id, data)
+        return outbox_id
+    
+    @_serializado
+    def save_notificaciones(self, user_id: str, modo: str, channel_id: str = None,
+                            guild_id: str = None, digest_minutes: int = None):
+        """Guarda la preferencia de /notificaciones (save_sesion no incluye estas columnas)"""
+        with self.conn.cursor() as cur:
             cur.execute("""
-                INSERT INTO sesiones (
-                    discord_user_id, github_username, github_id, token,
-                    expira_token, codespace, repo_name, repo_full_name,
-                    tunnel_url, tunnel_port, tunnel_type, voicechat_address,
-                    tunnel_actualizado, auto_configured, devcontainer_created,
-                    startup_created, configured_at, vinculado_at, updated_at
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                ON CONFLICT (discord_user_id) DO UPDATE SET
-                    github_username = EXCLUDED.github_username,
-                    github_id = EXCLUDED.github_id,
-                    token = EXCLUDED.token,
-                    expira_token = EXCLUDED.expira_token,
-                    codespace = EXCLUDED.codespace,
-                    repo_name = EXCLUDED.repo_name,
-                    repo_full_name = EXCLUDED.repo_full_name,
-                    tunnel_url = EXCLUDED.tunnel_url,
-                    tunnel_port = EXCLUDED.tunnel_port,
-                    tunnel_type = EXCLUDED.tunnel_type,
-                    voicechat_address = EXCLUDED.voicechat_address,
-                    tunnel_actualizado = EXCLUDED.tunnel_actualizado,
-                    auto_configured = EXCLUDED.auto_configured,
-                    devcontainer_created = EXCLUDED.devcontainer_created,
-                    startup_created = EXCLUDED.startup_created,
-                    configured_at = EXCLUDED.configured_at,
+                UPDATE sesiones SET
+                    notification_mode = %s,
+                    notification_channel_id = %s,
+                    notification_guild_id = %s,
+                    notification_digest_minutes = COALESCE(%s, notification_digest_minutes),
                     updated_at = NOW()
-            """, (
-                user_id, data.get("github_username"), data.get("github_id"), data.get("token"),
-                expira_token, data.get("codespace"), data.get("repo_name"), data.get("repo_full_name"),
-                data.get("tunnel_url"), data.get("tunnel_port"), data.get("tunnel_type"),
-                data.get("voicechat_address"), tunnel_actualizado, data.get("auto_configured", False),
-                data.get("devcontainer_created", False), data.get("startup_created", False),
-                configured_at, vinculado_at
-            ))
+                WHERE discord_user_id = %s
+            """, (modo, channel_id, guild_id, digest_minutes, user_id))
             self.conn.commit()
     
+    @_serializado
     def delete_sesion(self, user_id: str):
         with self.conn.cursor() as cur:
             cur.execute("DELETE FROM sesiones WHERE discord_user_id = %s", (user_id,))
             self.conn.commit()
+        self._notificar_cambio_sesion(user_id, None)
+    
+    def suscribir_cambios_sesion(self, callback):
+        """Registra `callback(user_id, data)`; data es None cuando se elimina la sesión"""
+        self._oyentes_sesion.append(callback)
+    
+    def _notificar_cambio_sesion(self, user_id: str, data):
+        for callback in self._oyentes_sesion:
+            try:
+                callback(user_id, data)
+            except Exception as e:
+                print(f"⚠️ Error notificando cambio de sesión: {e}")
     
+    @_serializado
     def get_vinculaciones(self) -> dict:
         with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM vinculaciones")
             results = cur.fetchall()
             return {row["discord_user_id"]: {"github_username": row["github_username"]} for row in results}
     
+    @_serializado
     def save_vinculacion(self, user_id: str, github_username: str):
         with self.conn.cursor() as cur:
             cur.execute("""
@@ -170,23 +326,27 @@ class Database:
             """, (user_id, github_username))
             self.conn.commit()
     
+    @_serializado
     def delete_vinculacion(self, user_id: str):
         with self.conn.cursor() as cur:
             cur.execute("DELETE FROM vinculaciones WHERE discord_user_id = %s", (user_id,))
             self.conn.commit()
     
+    @_serializado
     def get_permisos(self) -> dict:
         with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM permisos")
             results = cur.fetchall()
             return {row["discord_user_id"]: {"rol": row["rol"]} for row in results}
     
+    @_serializado
     def get_permiso(self, user_id: str) -> dict:
         with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("SELECT * FROM permisos WHERE discord_user_id = %s", (user_id,))
             result = cur.fetchone()
             return dict(result) if result else None
     
+    @_serializado
     def save_permiso(self, user_id: str, rol: str, asignado_por: str = None):
         with self.conn.cursor() as cur:
             cur.execute("""
@@ -199,11 +359,276 @@ class Database:
             """, (user_id, rol, asignado_por))
             self.conn.commit()
     
+    @_serializado
     def delete_permiso(self, user_id: str):
         with self.conn.cursor() as cur:
             cur.execute("DELETE FROM permisos WHERE discord_user_id = %s", (user_id,))
             self.conn.commit()
     
+    @_serializado
+    def get_monitores_minecraft(self) -> dict:
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM minecraft_monitoreo")
+            results = cur.fetchall()
+            return {
+                row["discord_user_id"]: {
+                    "ip": row["ip"],
+                    "channel_id": int(row["channel_id"]),
+                    "ultimo_estado": bool(row["ultimo_estado"])
+                }
+                for row in results
+            }
+    
+    @_serializado
+    def save_monitor_minecraft(self, user_id: str, ip: str, channel_id, ultimo_estado: bool):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO minecraft_monitoreo (discord_user_id, ip, channel_id, ultimo_estado)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (discord_user_id) DO UPDATE SET
+                    ip = EXCLUDED.ip,
+                    channel_id = EXCLUDED.channel_id,
+                    ultimo_estado = EXCLUDED.ultimo_estado,
+                    actualizado_at = NOW()
+            """, (user_id, ip, str(channel_id), ultimo_estado))
+            self.conn.commit()
+    
+    @_serializado
+    def delete_monitor_minecraft(self, user_id: str):
+        with self.conn.cursor() as cur:
+            cur.execute("DELETE FROM minecraft_monitoreo WHERE discord_user_id = %s", (user_id,))
+            self.conn.commit()
+    
+    @_serializado
+    def get_eventos_entregados(self, limite: int) -> list:
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT codespace, event_id FROM eventos_entregados
+                ORDER BY entregado_at DESC LIMIT %s
+            """, (limite,))
+            return [(row[0], row[1]) for row in cur.fetchall()]
+    
+    @_serializado
+    def existe_evento_entregado(self, codespace: str, event_id: str) -> bool:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "SELECT 1 FROM eventos_entregados WHERE codespace = %s AND event_id = %s",
+                (codespace, event_id)
+            )
+            return cur.fetchone() is not None
+    
+    @_serializado
+    def save_evento_entregado(self, codespace: str, event_id: str):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO eventos_entregados (codespace, event_id)
+                VALUES (%s, %s)
+                ON CONFLICT (codespace, event_id) DO NOTHING
+            """, (codespace, event_id))
+            self.conn.commit()
+    
+    @_serializado
+    def purgar_eventos_entregados(self, dias: int, maximo: int):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM eventos_entregados WHERE entregado_at < NOW() - make_interval(days => %s)",
+                (dias,)
+            )
+            cur.execute("""
+                DELETE FROM eventos_entregados WHERE (codespace, event_id) IN (
+                    SELECT codespace, event_id FROM eventos_entregados
+                    ORDER BY entregado_at DESC OFFSET %s
+                )
+            """, (maximo,))
+            self.conn.commit()
+    
+    @_serializado
+    def save_entrega_pendiente(self, entrega: dict, espera: float) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO entregas_pendientes (
+                    user_id, destino_tipo, destino_id, mensaje, origen,
+                    intentos, ultimo_error, proximo_intento
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, NOW() + make_interval(secs => %s))
+                RETURNING id
+            """, (
+                entrega.get("user_id"), entrega["destino_tipo"], entrega["destino_id"],
+                entrega["mensaje"], entrega.get("origen"), entrega.get("intentos", 0),
+                entrega.get("ultimo_error"), espera
+            ))
+            entrega_id = cur.fetchone()[0]
+            self.conn.commit()
+            return entrega_id
+    
+    @_serializado
+    def get_entregas_pendientes(self, limite: int) -> list:
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT * FROM entregas_pendientes
+                WHERE proximo_intento <= NOW()
+                ORDER BY proximo_intento LIMIT %s
+            """, (limite,))
+            return [dict(row) for row in cur.fetchall()]
+    
+    @_serializado
+    def reprogramar_entrega_pendiente(self, entrega_id: int, intentos: int, espera: float, error: str):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE entregas_pendientes SET
+                    intentos = %s,
+                    ultimo_error = %s,
+                    proximo_intento = NOW() + make_interval(secs => %s)
+                WHERE id = %s
+            """, (intentos, error, espera, entrega_id))
+            self.conn.commit()
+    
+    @_serializado
+    def delete_entrega_pendiente(self, entrega_id: int):
+        with self.conn.cursor() as cur:
+            cur.execute("DELETE FROM entregas_pendientes WHERE id = %s", (entrega_id,))
+            self.conn.commit()
+    
+    @_serializado
+    def save_entrega_fallida(self, entrega: dict, error: str) -> int:
+        """Guarda la entrega como fallida y la quita de pendientes si estaba ahí"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO entregas_fallidas (
+                    user_id, destino_tipo, destino_id, mensaje, origen, intentos, error
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (
+                entrega.get("user_id"), entrega["destino_tipo"], entrega["destino_id"],
+                entrega["mensaje"], entrega.get("origen"), entrega.get("intentos", 0), error
+            ))
+            fallida_id = cur.fetchone()[0]
+            if entrega.get("id"):
+                cur.execute("DELETE FROM entregas_pendientes WHERE id = %s", (entrega["id"],))
+            self.conn.commit()
+            return fallida_id
+    
+    @_serializado
+    def get_entregas_fallidas(self, user_id: str = None, limite: int = 10) -> list:
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if user_id:
+                cur.execute("""
+                    SELECT * FROM entregas_fallidas WHERE user_id = %s
+                    ORDER BY fallido_at DESC LIMIT %s
+                """, (user_id, limite))
+            else:
+                cur.execute("""
+                    SELECT * FROM entregas_fallidas
+                    ORDER BY fallido_at DESC LIMIT %s
+                """, (limite,))
+            return [dict(row) for row in cur.fetchall()]
+    
+    @_serializado
+    def reintentar_entregas_fallidas(self, ids: list) -> int:
+        """Devuelve entregas fallidas a la cola de pendientes; retorna cuántas se movieron"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                WITH movidas AS (
+                    DELETE FROM entregas_fallidas WHERE id = ANY(%s)
+                    RETURNING user_id, destino_tipo, destino_id, mensaje, origen, creado_at
+                )
+                INSERT INTO entregas_pendientes (
+                    user_id, destino_tipo, destino_id, mensaje, origen, creado_at
+                )
+                SELECT user_id, destino_tipo, destino_id, mensaje, origen, creado_at FROM movidas
+            """, (list(ids),))
+            movidas = cur.rowcount
+            self.conn.commit()
+            return movidas
+    
+    @_serializado
+    def save_outbox(self, user_id: str, tipo: str, payload: str) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO webhook_outbox (user_id, tipo, payload)
+                VALUES (%s, %s, %s) RETURNING id
+            """, (user_id, tipo, payload))
+            outbox_id = cur.fetchone()[0]
+            self.conn.commit()
+            return outbox_id
+    
+    @_serializado
+    def arrendar_outbox(self, owner: str, lease: float, limite: int) -> list:
+        """
+        Toma hasta `limite` entradas libres o con lease vencido y las reserva
+        para `owner` durante `lease` segundos. SKIP LOCKED permite que varias
+        réplicas drenen la tabla sin pisarse.
+        """
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                UPDATE webhook_outbox SET
+                    lease_owner = %s,
+                    lease_hasta = NOW() + make_interval(secs => %s)
+                WHERE id IN (
+                    SELECT id FROM webhook_outbox
+                    WHERE lease_hasta IS NULL OR lease_hasta <= NOW()
+                    ORDER BY id LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *
+            """, (owner, lease, limite))
+            entradas = [dict(row) for row in cur.fetchall()]
+            self.conn.commit()
+            return sorted(entradas, key=lambda e: e["id"])
+    
+    @_serializado
+    def completar_outbox(self, outbox_id: int, owner: str):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM webhook_outbox WHERE id = %s AND lease_owner = %s",
+                (outbox_id, owner)
+            )
+            self.conn.commit()
+    
+    @_serializado
+    def reprogramar_outbox(self, outbox_id: int, owner: str, espera: float, error: str):
+        """Registra el fallo y mantiene el lease hasta el próximo intento"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE webhook_outbox SET
+                    intentos = intentos + 1,
+                    ultimo_error = %s,
+                    lease_hasta = NOW() + make_interval(secs => %s)
+                WHERE id = %s AND lease_owner = %s
+            """, (error, espera, outbox_id, owner))
+            self.conn.commit()
+    
+    @_serializado
+    def contar_outbox(self) -> int:
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM webhook_outbox")
+            return cur.fetchone()[0]
+    
+    @_serializado
+    def save_resumen_pendiente(self, user_id: str, ts: int, titulo: str, origen: str,
+                               minutos: int, enviar_en: int) -> int:
+        """Guarda un aviso agrupado para el modo resumen (ts y enviar_en en epoch)"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO resumenes_pendientes (user_id, ts, titulo, origen, minutos, enviar_en)
+                VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
+            """, (user_id, ts, titulo, origen, minutos, enviar_en))
+            resumen_id = cur.fetchone()[0]
+            self.conn.commit()
+            return resumen_id
+    
+    @_serializado
+    def get_resumenes_pendientes(self) -> list:
+        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM resumenes_pendientes ORDER BY id")
+            return [dict(row) for row in cur.fetchall()]
+    
+    @_serializado
+    def delete_resumenes_pendientes(self, ids: list):
+        with self.conn.cursor() as cur:
+            cur.execute("DELETE FROM resumenes_pendientes WHERE id = ANY(%s)", (list(ids),))
+            self.conn.commit()
+    
+    @_serializado
     def close(self):
         if self.conn:
             self.conn.close()
@@ -214,4 +639,11 @@ def get_db() -> Database:
     global _db_instance
     if _db_instance is None:
         _db_instance = Database()
-    return _db_instance
\ No newline at end of file
+    return _db_instance
+
+_executor_db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+async def en_hilo_db(funcion, *args):
+    """Ejecuta una llamada bloqueante a la base de datos fuera del loop del bot"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor_db, functools.partial(funcion, *args))
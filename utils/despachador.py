@@ -0,0 +1,383 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import discord
+
+from utils.database import get_db, en_hilo_db
+from utils.entregas import get_entregas, DM, CANAL, FALLIDO
+
+# Punto único de salida de notificaciones hacia Discord. Cada destino (DM o
+# canal) tiene su propia cola: lo que llega dentro de una ventana corta se
+# agrupa en un solo mensaje de hasta 10 embeds, los envíos a un mismo destino
+# se espacian y un token bucket global mantiene el total bajo el límite de
+# la API. La preferencia /notificaciones de cada usuario se resuelve aquí,
+# incluido el modo resumen, que junta los avisos de un usuario durante una
+# ventana configurable y los envía como un único embed. Cada aviso agrupado
+# se guarda en resumenes_pendientes antes de devolver AGRUPADO, así quien lo
+# confirma (p. ej. el ack de un evento del addon) no lo pierde si el bot se
+# reinicia a mitad de la ventana: `restaurar` retoma los resúmenes al cargar.
+
+DESACTIVADO = "desactivado"
+AGRUPADO = "agrupado"
+# En cola del despachador, sin esperar el envío (ver `esperar`)
+ENCOLADO = "encolado"
+
+RESUMEN_MINUTOS_POR_DEFECTO = 60
+RESUMEN_MAX_LINEAS = 25
+
+MAX_EMBEDS = 10
+MAX_CONTENIDO = 2000
+
+
+class _Pendiente:
+    __slots__ = ('embed', 'content', 'origen', 'user_id', 'future')
+
+    def __init__(self, embed, content, origen, user_id, future):
+        self.embed = embed
+        self.content = content
+        self.origen = origen
+        self.user_id = user_id
+        self.future = future
+
+
+class _Resumen:
+    __slots__ = ('eventos', 'ids', 'minutos', 'enviar_en', 'tarea')
+
+    def __init__(self, minutos: int, enviar_en: float):
+        self.eventos = []
+        self.ids = []
+        self.minutos = minutos
+        self.enviar_en = enviar_en
+        self.tarea: Optional[asyncio.Task] = None
+
+
+class Despachador:
+    def __init__(
+        self,
+        ventana: float = 1.5,
+        intervalo_destino: float = 1.0,
+        envios_por_segundo: float = 25
+    ):
+        self.ventana = ventana
+        self.intervalo_destino = intervalo_destino
+        self.envios_por_segundo = envios_por_segundo
+        self.bot = None
+        self._colas: Dict[Tuple[str, str], Deque[_Pendiente]] = {}
+        self._tareas: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._ultimo_envio: Dict[Tuple[str, str], float] = {}
+        self._resumenes: Dict[str, _Resumen] = {}
+        self._tokens = envios_por_segundo
+        self._rellenado = time.monotonic()
+        self.stats = {
+            'notificaciones': 0,
+            'mensajes': 0,
+            'desactivadas': 0,
+            'agrupadas': 0,
+            'resumenes': 0
+        }
+
+    def configurar(self, bot):
+        self.bot = bot
+
+    async def restaurar(self):
+        """Retoma los resúmenes que quedaron a medias en resumenes_pendientes"""
+        try:
+            filas = await en_hilo_db(get_db().get_resumenes_pendientes)
+        except Exception as e:
+            print(f"⚠️ No se pudieron restaurar los resúmenes pendientes: {e}")
+            return
+
+        # Lo que ya está en memoria (agrupado tras arrancar) no se duplica
+        en_memoria = {resumen_id for resumen in self._resumenes.values() for resumen_id in resumen.ids}
+        restaurados = 0
+        for fila in filas:
+            if fila["id"] in en_memoria:
+                continue
+            resumen = self._resumenes.get(fila["user_id"])
+            if resumen is None:
+                resumen = self._nuevo_resumen(fila["user_id"], fila["minutos"], fila["enviar_en"])
+                restaurados += 1
+            resumen.enviar_en = min(resumen.enviar_en, fila["enviar_en"])
+            resumen.eventos.append((fila["ts"], fila["titulo"], fila["origen"]))
+            resumen.ids.append(fila["id"])
+        if restaurados:
+            print(f"📬 {restaurados} resumen(es) pendiente(s) restaurado(s)")
+
+    async def stop(self):
+        # Los resúmenes en curso se envían antes de cerrar
+        for resumen in self._resumenes.values():
+            if resumen.tarea:
+                resumen.tarea.cancel()
+        await asyncio.gather(
+            *(self._enviar_resumen(user_id) for user_id in list(self._resumenes)),
+            return_exceptions=True
+        )
+
+        # Lo ya encolado tiene unos segundos para salir; el resto se descarta
+        if self._tareas:
+            await asyncio.wait(list(self._tareas.values()), timeout=10)
+        for tarea in list(self._tareas.values()):
+            tarea.cancel()
+        if self._tareas:
+            await asyncio.gather(*self._tareas.values(), return_exceptions=True)
+
+    def _cargar_sesion(self, user_id: str, sesion: Optional[dict]) -> dict:
+        if sesion is not None:
+            return sesion
+        try:
+            return get_db().get_sesion(user_id) or {}
+        except Exception as e:
+            print(f"⚠️ No se pudo leer la preferencia de notificaciones de {user_id}: {e}")
+            return {}
+
+    def _resolver_destino(self, user_id: str, sesion: dict) -> Optional[Tuple[str, str]]:
+        """Aplica la preferencia de /notificaciones: DM, canal o desactivadas"""
+        modo = sesion.get("notification_mode") or "dm"
+        if modo == "disabled":
+            return None
+
+        if modo == "channel":
+            channel_id = sesion.get("notification_channel_id")
+            if channel_id and self.bot and self.bot.get_channel(int(channel_id)):
+                return CANAL, str(channel_id)
+            print(f"⚠️ Canal de notificaciones de {user_id} no disponible, enviando DM")
+
+        return DM, user_id
+
+    async def notificar_usuario(
+        self,
+        user_id,
+        embed: Optional[discord.Embed] = None,
+        content: Optional[str] = None,
+        origen: str = "",
+        sesion: Optional[dict] = None,
+        urgente: bool = False,
+        esperar: bool = False
+    ) -> str:
+        """
+        Notifica a un usuario según su preferencia.
+        Con `urgente` el aviso se envía aunque el usuario use modo resumen.
+        Retorna DESACTIVADO, AGRUPADO, ENCOLADO o, con `esperar`, el
+        resultado de la entrega (ver utils.entregas).
+        """
+        user_id = str(user_id)
+        sesion = self._cargar_sesion(user_id, sesion)
+
+        if sesion.get("notification_mode") == "digest" and not urgente:
+            minutos = sesion.get("notification_digest_minutes") or RESUMEN_MINUTOS_POR_DEFECTO
+            if await self._agrupar(user_id, embed, content, origen, minutos):
+                return AGRUPADO
+
+        destino = self._resolver_destino(user_id, sesion)
+        if destino is None:
+            self.stats['desactivadas'] += 1
+            return DESACTIVADO
+
+        destino_tipo, destino_id = destino
+        if destino_tipo == CANAL:
+            # En un canal compartido hay que indicar a quién va dirigido
+            if embed is not None:
+                embed = embed.copy()
+                embed.description = f"<@{user_id}>\n\n" + (embed.description or "")
+            elif content:
+                content = f"<@{user_id}> {content}"
+
+        return await self.enviar(destino_tipo, destino_id, embed, content, origen, user_id, esperar)
+
+    async def enviar(
+        self,
+        destino_tipo: str,
+        destino_id,
+        embed: Optional[discord.Embed] = None,
+        content: Optional[str] = None,
+        origen: str = "",
+        user_id=None,
+        esperar: bool = False
+    ) -> str:
+        """
+        Encola un embed y/o texto para el destino. Por defecto retorna ENCOLADO
+        al momento: quien procesa eventos en orden no debe esperar la ventana
+        de agrupación, o nunca se juntaría más de un aviso. Con `esperar`
+        retorna el resultado del envío.
+        """
+        clave = (destino_tipo, str(destino_id))
+        future = asyncio.get_running_loop().create_future() if esperar else None
+        self._colas.setdefault(clave, deque()).append(
+            _Pendiente(embed, content, origen, user_id, future)
+        )
+        self.stats['notificaciones'] += 1
+
+        if clave not in self._tareas:
+            self._tareas[clave] = asyncio.create_task(self._vaciar(clave))
+
+        if future is None:
+            return ENCOLADO
+        # shield: si quien espera se cancela, el envío sigue su curso
+        return await asyncio.shield(future)
+
+    def _nuevo_resumen(self, user_id: str, minutos: int, enviar_en: float) -> _Resumen:
+        resumen = _Resumen(minutos, enviar_en)
+        self._resumenes[user_id] = resumen
+        resumen.tarea = asyncio.create_task(self._esperar_resumen(user_id, resumen))
+        return resumen
+
+    async def _agrupar(self, user_id: str, embed, content, origen: str, minutos: int) -> bool:
+        """Guarda el aviso para el resumen; retorna False si no se pudo guardar"""
+        resumen = self._resumenes.get(user_id)
+        enviar_en = resumen.enviar_en if resumen else time.time() + minutos * 60
+
+        if embed is not None:
+            titulo = embed.title or embed.description or "Notificación"
+        else:
+            titulo = content or "Notificación"
+        titulo = titulo.splitlines()[0][:100]
+        ts = int(time.time())
+
+        try:
+            resumen_id = await en_hilo_db(
+                get_db().save_resumen_pendiente, user_id, ts, titulo, origen, minutos, int(enviar_en)
+            )
+        except Exception as e:
+            # Sin guardar no se puede prometer que llegue: se envía al momento
+            print(f"⚠️ No se pudo guardar el aviso en el resumen de {user_id}, se envía ahora: {e}")
+            return False
+
+        # Durante la escritura la ventana pudo cerrarse o abrirse otra
+        resumen = self._resumenes.get(user_id) or self._nuevo_resumen(user_id, minutos, enviar_en)
+        resumen.eventos.append((ts, titulo, origen))
+        resumen.ids.append(resumen_id)
+        self.stats['agrupadas'] += 1
+        return True
+
+    async def _esperar_resumen(self, user_id: str, resumen: _Resumen):
+        await asyncio.sleep(max(0, resumen.enviar_en - time.time()))
+        await self._enviar_resumen(user_id)
+
+    async def _enviar_resumen(self, user_id: str):
+        resumen = self._resumenes.pop(user_id, None)
+        if not resumen or not resumen.eventos:
+            return
+
+        conteo: Dict[str, int] = {}
+        for _, titulo, _ in resumen.eventos:
+            conteo[titulo] = conteo.get(titulo, 0) + 1
+
+        embed = discord.Embed(
+            title="📬 Resumen de Notificaciones",
+            description="\n".join(
+                f"**{titulo}** × {veces}" for titulo, veces in
+                sorted(conteo.items(), key=lambda item: item[1], reverse=True)
+            )[:4000],
+            color=discord.Color.blurple()
+        )
+
+        recientes = resumen.eventos[-RESUMEN_MAX_LINEAS:]
+        lineas = [f"<t:{ts}:t> {titulo}" for ts, titulo, _ in recientes]
+        if len(resumen.eventos) > len(recientes):
+            lineas.insert(0, f"… y {len(resumen.eventos) - len(recientes)} anteriores")
+        embed.add_field(name="Últimos avisos", value="\n".join(lineas)[:1024], inline=False)
+        embed.set_footer(text=f"{len(resumen.eventos)} aviso(s) en {resumen.minutos} min • /notificaciones para cambiar el modo")
+
+        self.stats['resumenes'] += 1
+        try:
+            # Se espera el envío para que stop() no cierre la cola antes de
+            # tiempo; ENVIADO, EN_COLA y FALLIDO ya quedan registrados en
+            # utils.entregas, así que a partir de aquí las filas sobran
+            await self.enviar(DM, user_id, embed, origen="resumen", user_id=user_id, esperar=True)
+            await en_hilo_db(get_db().delete_resumenes_pendientes, resumen.ids)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Error enviando resumen a {user_id}: {e}")
+
+    def _tomar_lote(self, cola: Deque[_Pendiente]):
+        lote = [cola.popleft()]
+        embeds = 1 if lote[0].embed is not None else 0
+        contenido = len(lote[0].content or "")
+
+        while cola:
+            siguiente = cola[0]
+            mas_embeds = embeds + (1 if siguiente.embed is not None else 0)
+            mas_contenido = contenido + len(siguiente.content or "") + 1
+            if mas_embeds > MAX_EMBEDS or mas_contenido > MAX_CONTENIDO:
+                break
+            lote.append(cola.popleft())
+            embeds, contenido = mas_embeds, mas_contenido
+        return lote
+
+    async def _esperar_turno(self, clave: Tuple[str, str]):
+        # Espaciado por destino
+        espera = self._ultimo_envio.get(clave, 0) + self.intervalo_destino - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+        # Token bucket global
+        while True:
+            ahora = time.monotonic()
+            self._tokens = min(
+                self.envios_por_segundo,
+                self._tokens + (ahora - self._rellenado) * self.envios_por_segundo
+            )
+            self._rellenado = ahora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.envios_por_segundo)
+
+    async def _vaciar(self, clave: Tuple[str, str]):
+        destino_tipo, destino_id = clave
+        cola = self._colas[clave]
+        lote = []
+        try:
+            while cola:
+                # Ventana de agrupación para lo que llegue al mismo destino
+                if len(cola) < MAX_EMBEDS:
+                    await asyncio.sleep(self.ventana)
+                await self._esperar_turno(clave)
+
+                lote = self._tomar_lote(cola)
+                contenido = "\n".join(p.content for p in lote if p.content) or None
+                origenes = sorted({p.origen for p in lote if p.origen})
+
+                try:
+                    resultado = await get_entregas().enviar(
+                        destino_tipo,
+                        destino_id,
+                        content=contenido,
+                        embeds=[p.embed for p in lote if p.embed is not None],
+                        origen=",".join(origenes),
+                        user_id=lote[0].user_id
+                    )
+                except Exception as e:
+                    print(f"❌ Error despachando a {destino_tipo} {destino_id}: {e}")
+                    resultado = FALLIDO
+                self._ultimo_envio[clave] = time.monotonic()
+                self.stats['mensajes'] += 1
+
+                for pendiente in lote:
+                    if pendiente.future and not pendiente.future.done():
+                        pendiente.future.set_result(resultado)
+                lote = []
+        finally:
+            for pendiente in lote + list(cola):
+                if pendiente.future and not pendiente.future.done():
+                    pendiente.future.cancel()
+            self._colas.pop(clave, None)
+            self._tareas.pop(clave, None)
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.copy()
+        stats['destinos_activos'] = len(self._tareas)
+        stats['resumenes_pendientes'] = len(self._resumenes)
+        return stats
+
+
+_despachador_instance = None
+
+def get_despachador() -> Despachador:
+    global _despachador_instance
+    if _despachador_instance is None:
+        _despachador_instance = Despachador()
+    return _despachador_instance
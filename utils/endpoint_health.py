@@ -0,0 +1,73 @@
+import time
+from typing import Dict, Optional
+
+# Estado de salud por endpoint (URL de túnel o Codespace). Cada fallo
+# consecutivo duplica la espera hasta el próximo intento, y un endpoint que
+# lleva demasiado tiempo sin responder pasa a cuarentena: solo se le envía
+# una sonda de recuperación cada tanto hasta que vuelva a contestar.
+
+
+class _Estado:
+    __slots__ = ('fallos', 'primer_fallo', 'proximo_intento', 'cuarentena')
+
+    def __init__(self, primer_fallo: float):
+        self.fallos = 0
+        self.primer_fallo = primer_fallo
+        self.proximo_intento = primer_fallo
+        self.cuarentena = False
+
+
+class EndpointHealth:
+    def __init__(
+        self,
+        backoff_base: float = 30,
+        backoff_max: float = 900,
+        cuarentena_tras: float = 6 * 3600,
+        sonda_intervalo: float = 3600
+    ):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cuarentena_tras = cuarentena_tras
+        self.sonda_intervalo = sonda_intervalo
+        self._estados: Dict[str, _Estado] = {}
+
+    def disponible(self, url: str, ahora: Optional[float] = None) -> bool:
+        """Indica si toca intentar el endpoint en este ciclo"""
+        estado = self._estados.get(url)
+        if estado is None:
+            return True
+        return estado.proximo_intento <= (ahora if ahora is not None else time.monotonic())
+
+    def en_cuarentena(self, url: str) -> bool:
+        estado = self._estados.get(url)
+        return bool(estado and estado.cuarentena)
+
+    def registrar_exito(self, url: str):
+        self._estados.pop(url, None)
+
+    def registrar_fallo(self, url: str, ahora: Optional[float] = None):
+        ahora = ahora if ahora is not None else time.monotonic()
+        estado = self._estados.setdefault(url, _Estado(primer_fallo=ahora))
+        estado.fallos += 1
+
+        if ahora - estado.primer_fallo >= self.cuarentena_tras:
+            estado.cuarentena = True
+            espera = self.sonda_intervalo
+        else:
+            espera = min(self.backoff_base * 2 ** (estado.fallos - 1), self.backoff_max)
+        estado.proximo_intento = ahora + espera
+
+    def olvidar(self, url: str):
+        self._estados.pop(url, None)
+
+    def get_stats(self) -> Dict:
+        ahora = time.monotonic()
+        cuarentena = sum(1 for e in self._estados.values() if e.cuarentena)
+        return {
+            'con_fallos': len(self._estados),
+            'en_espera': sum(
+                1 for e in self._estados.values()
+                if not e.cuarentena and e.proximo_intento > ahora
+            ),
+            'en_cuarentena': cuarentena
+        }
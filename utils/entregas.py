@@ -0,0 +1,204 @@
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+import aiohttp
+import discord
+
+from utils.database import get_db
+from utils.resolver_discord import get_discord_resolver
+
+# Entregas salientes a Discord (DMs y canales) con reintentos persistentes.
+# Si un envío falla por un error transitorio (429, 5xx, red) se guarda en
+# entregas_pendientes y un worker lo reintenta con backoff exponencial,
+# respetando el retry_after de Discord. Los errores permanentes (DMs
+# bloqueados, usuario o canal inexistente) van a entregas_fallidas, desde
+# donde se pueden revisar y reintentar a mano.
+
+DM = "dm"
+CANAL = "channel"
+
+ENVIADO = "enviado"
+EN_COLA = "en_cola"
+FALLIDO = "fallido"
+
+
+def clasificar_error(error: BaseException) -> Optional[float]:
+    """
+    Retorna None si el error es permanente, o la espera mínima en segundos
+    antes de reintentar (0 = usar el backoff normal).
+    """
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if isinstance(error, (discord.Forbidden, discord.NotFound)):
+        return None
+    if isinstance(error, discord.HTTPException):
+        if error.status == 429:
+            try:
+                return float(error.response.headers.get("Retry-After", 0))
+            except (AttributeError, TypeError, ValueError):
+                return 0.0
+        return 0.0 if error.status >= 500 else None
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError, RuntimeError)):
+        return 0.0
+    return None
+
+
+def describir_error(error: BaseException) -> str:
+    if isinstance(error, discord.Forbidden):
+        return "No se puede enviar (DMs bloqueados o sin permisos)"
+    if isinstance(error, discord.NotFound):
+        return "Usuario o canal no encontrado"
+    return f"{type(error).__name__}: {error}"[:500]
+
+
+class EntregaQueue:
+    def __init__(
+        self,
+        base: float = 10,
+        max_espera: float = 3600,
+        max_intentos: int = 10,
+        intervalo: float = 5,
+        lote: int = 20
+    ):
+        self.base = base
+        self.max_espera = max_espera
+        self.max_intentos = max_intentos
+        self.intervalo = intervalo
+        self.lote = lote
+        self.bot = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'enviados': 0,
+            'reintentados': 0,
+            'encolados': 0,
+            'fallidos': 0
+        }
+
+    def configurar(self, bot):
+        self.bot = bot
+        get_discord_resolver().configurar(bot)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def enviar(
+        self,
+        destino_tipo: str,
+        destino_id,
+        content: Optional[str] = None,
+        embeds: Optional[List[discord.Embed]] = None,
+        origen: str = "",
+        user_id=None
+    ) -> str:
+        """
+        Envía un mensaje a un DM (destino_id = user id) o canal.
+        Retorna ENVIADO, EN_COLA (se reintentará) o FALLIDO (quedó en fallidas).
+        """
+        if user_id is None and destino_tipo == DM:
+            user_id = destino_id
+
+        entrega = {
+            "user_id": str(user_id) if user_id is not None else None,
+            "destino_tipo": destino_tipo,
+            "destino_id": str(destino_id),
+            "mensaje": json.dumps({
+                "content": content,
+                "embeds": [embed.to_dict() for embed in embeds or []]
+            }),
+            "origen": origen,
+            "intentos": 0
+        }
+
+        try:
+            await self._enviar(entrega)
+        except Exception as e:
+            return self._registrar_fallo(entrega, e)
+
+        self.stats['enviados'] += 1
+        return ENVIADO
+
+    async def _destino(self, destino_tipo: str, destino_id: int):
+        if self.bot is None:
+            raise RuntimeError("Bot no configurado para entregas")
+        resolver = get_discord_resolver()
+        if destino_tipo == CANAL:
+            return await resolver.canal(destino_id)
+        return await resolver.canal_dm(destino_id)
+
+    async def _enviar(self, entrega: Dict):
+        mensaje = json.loads(entrega["mensaje"])
+        destino = await self._destino(entrega["destino_tipo"], int(entrega["destino_id"]))
+        await destino.send(
+            content=mensaje.get("content"),
+            embeds=[discord.Embed.from_dict(e) for e in mensaje.get("embeds", [])]
+        )
+
+    def _registrar_fallo(self, entrega: Dict, error: BaseException) -> str:
+        intentos = entrega.get("intentos", 0) + 1
+        espera_minima = clasificar_error(error)
+        descripcion = describir_error(error)
+        entrega = {**entrega, "intentos": intentos, "ultimo_error": descripcion}
+        db = get_db()
+
+        try:
+            if espera_minima is None or intentos >= self.max_intentos:
+                db.save_entrega_fallida(entrega, descripcion)
+                self.stats['fallidos'] += 1
+                print(f"❌ Entrega a {entrega['destino_tipo']} {entrega['destino_id']} descartada: {descripcion}")
+                return FALLIDO
+
+            espera = max(min(self.base * 2 ** (intentos - 1), self.max_espera), espera_minima)
+            if entrega.get("id"):
+                db.reprogramar_entrega_pendiente(entrega["id"], intentos, espera, descripcion)
+            else:
+                db.save_entrega_pendiente(entrega, espera)
+                self.stats['encolados'] += 1
+            print(f"⏳ Entrega a {entrega['destino_tipo']} {entrega['destino_id']} reintentará en {espera:.0f}s: {descripcion}")
+            return EN_COLA
+        except Exception as e:
+            print(f"❌ Error guardando entrega fallida: {e}")
+            return FALLIDO
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.procesar_pendientes()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error procesando entregas pendientes: {e}")
+            await asyncio.sleep(self.intervalo)
+
+    async def procesar_pendientes(self):
+        if self.bot is None or not self.bot.is_ready():
+            return
+
+        for entrega in get_db().get_entregas_pendientes(self.lote):
+            self.stats['reintentados'] += 1
+            try:
+                await self._enviar(entrega)
+            except Exception as e:
+                self._registrar_fallo(entrega, e)
+            else:
+                get_db().delete_entrega_pendiente(entrega["id"])
+                self.stats['enviados'] += 1
+
+    def get_stats(self) -> Dict:
+        return self.stats.copy()
+
+
+_queue_instance = None
+
+def get_entregas() -> EntregaQueue:
+    global _queue_instance
+    if _queue_instance is None:
+        _queue_instance = EntregaQueue()
+    return _queue_instance
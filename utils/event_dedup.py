@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from utils.database import get_db
+
+# Registro de eventos ya entregados por codespace. Se consulta antes de
+# entregar y se escribe después, así un ack perdido no produce un segundo
+# mensaje: la entrega es a lo sumo una vez y el ack se reintenta aparte.
+# La memoria guarda las claves recientes y la base de datos es la fuente
+# durable (sobrevive a reinicios del bot).
+
+
+class ProcessedEventStore:
+    def __init__(self, ttl_dias: int = 7, max_memoria: int = 10000, max_db: int = 100000):
+        self.ttl = ttl_dias * 86400
+        self.ttl_dias = ttl_dias
+        self.max_memoria = max_memoria
+        self.max_db = max_db
+        self._memoria: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cargado = False
+        self.stats = {
+            'duplicados': 0,
+            'registrados': 0,
+            'errores_db': 0
+        }
+
+    def _cargar(self):
+        # Precarga perezosa de las claves más recientes
+        self._cargado = True
+        try:
+            recientes = get_db().get_eventos_entregados(self.max_memoria)
+        except Exception as e:
+            self.stats['errores_db'] += 1
+            print(f"⚠️ Error cargando eventos entregados: {e}")
+            return
+        ahora = time.time()
+        for clave in reversed(recientes):
+            self._memoria[clave] = ahora
+
+    def _recordar(self, clave: Tuple[str, str]):
+        self._memoria[clave] = time.time()
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def entregado(self, codespace: str, event_id) -> bool:
+        """Indica si el evento ya fue entregado alguna vez"""
+        if not self._cargado:
+            self._cargar()
+
+        clave = (codespace, str(event_id))
+        visto = self._memoria.get(clave)
+        if visto is not None and time.time() - visto < self.ttl:
+            self.stats['duplicados'] += 1
+            return True
+
+        try:
+            existe = get_db().existe_evento_entregado(*clave)
+        except Exception as e:
+            # Sin base de datos se prioriza entregar antes que perder el evento
+            self.stats['errores_db'] += 1
+            print(f"⚠️ Error consultando evento entregado: {e}")
+            return False
+
+        if existe:
+            self._recordar(clave)
+            self.stats['duplicados'] += 1
+        return existe
+
+    def registrar(self, codespace: str, event_id):
+        """Marca el evento como entregado"""
+        clave = (codespace, str(event_id))
+        self._recordar(clave)
+        self.stats['registrados'] += 1
+        try:
+            get_db().save_evento_entregado(*clave)
+        except Exception as e:
+            self.stats['errores_db'] += 1
+            print(f"⚠️ Error guardando evento entregado: {e}")
+
+    def purgar(self):
+        """Elimina claves expiradas y recorta la tabla a su tamaño máximo"""
+        limite = time.time() - self.ttl
+        for clave in [c for c, visto in self._memoria.items() if visto < limite]:
+            del self._memoria[clave]
+        try:
+            get_db().purgar_eventos_entregados(self.ttl_dias, self.max_db)
+        except Exception as e:
+            self.stats['errores_db'] += 1
+            print(f"⚠️ Error purgando eventos entregados: {e}")
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.copy()
+        stats['en_memoria'] = len(self._memoria)
+        return stats
+
+
+_store_instance = None
+
+def get_event_store() -> ProcessedEventStore:
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = ProcessedEventStore()
+    return _store_instance
@@ -0,0 +1,113 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import WEBHOOK_SECRET
+
+# Firma HMAC de los webhooks que envía el Codespace. Cada usuario tiene su
+# propia clave, derivada de WEBHOOK_SECRET y su user_id, que setup_cog deja
+# en el startup.sh generado. La petición lleva un timestamp y la firma de
+# f"{timestamp}.{cuerpo}"; se rechazan timestamps fuera de ventana y firmas
+# ya vistas. Todo se resuelve en memoria, sin tocar la base de datos.
+
+CABECERA_TIMESTAMP = "X-Doce-Timestamp"
+CABECERA_FIRMA = "X-Doce-Signature"
+
+
+def clave_usuario(user_id, secreto: str = WEBHOOK_SECRET) -> str:
+    return hmac.new(secreto.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()
+
+
+def firmar(clave: str, timestamp: str, cuerpo: bytes) -> str:
+    return hmac.new(clave.encode(), timestamp.encode() + b"." + cuerpo, hashlib.sha256).hexdigest()
+
+
+class VerificadorFirmas:
+    def __init__(
+        self,
+        secreto: str = WEBHOOK_SECRET,
+        ventana: int = 300,
+        max_claves: int = 10000,
+        max_vistas: int = 50000
+    ):
+        self.secreto = secreto
+        self.ventana = ventana
+        self.max_claves = max_claves
+        self.max_vistas = max_vistas
+        self._claves: "OrderedDict[str, str]" = OrderedDict()
+        self._vistas: "OrderedDict[str, float]" = OrderedDict()
+        self.stats = {
+            'validas': 0,
+            'invalidas': 0,
+            'expiradas': 0,
+            'repetidas': 0
+        }
+
+    @property
+    def activo(self) -> bool:
+        return bool(self.secreto)
+
+    def _clave(self, user_id: str) -> str:
+        clave = self._claves.get(user_id)
+        if clave is None:
+            clave = clave_usuario(user_id, self.secreto)
+            self._claves[user_id] = clave
+            while len(self._claves) > self.max_claves:
+                self._claves.popitem(last=False)
+        return clave
+
+    def _purgar_vistas(self, ahora: float):
+        while self._vistas:
+            _, expira = next(iter(self._vistas.items()))
+            if expira > ahora and len(self._vistas) <= self.max_vistas:
+                break
+            self._vistas.popitem(last=False)
+
+    def verificar(self, user_id, timestamp: Optional[str], firma: Optional[str], cuerpo: bytes) -> Optional[str]:
+        """Retorna None si la firma es válida, o el motivo del rechazo"""
+        if not user_id or not timestamp or not firma:
+            self.stats['invalidas'] += 1
+            return "Firma requerida"
+
+        ahora = time.time()
+        try:
+            desfase = abs(ahora - int(timestamp))
+        except ValueError:
+            self.stats['invalidas'] += 1
+            return "Timestamp inválido"
+        if desfase > self.ventana:
+            self.stats['expiradas'] += 1
+            return "Timestamp fuera de ventana"
+
+        esperada = firmar(self._clave(str(user_id)), timestamp, cuerpo)
+        if not hmac.compare_digest(esperada, firma):
+            self.stats['invalidas'] += 1
+            return "Firma inválida"
+
+        self._purgar_vistas(ahora)
+        if firma in self._vistas:
+            self.stats['repetidas'] += 1
+            return "Petición repetida"
+        # Pasada la ventana el timestamp ya no es válido, no hace falta recordarla más
+        self._vistas[firma] = ahora + self.ventana
+
+        self.stats['validas'] += 1
+        return None
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.copy()
+        stats['activo'] = self.activo
+        stats['claves'] = len(self._claves)
+        stats['vistas'] = len(self._vistas)
+        return stats
+
+
+_verificador_instance = None
+
+def get_verificador_firmas() -> VerificadorFirmas:
+    global _verificador_instance
+    if _verificador_instance is None:
+        _verificador_instance = VerificadorFirmas()
+    return _verificador_instance
@@ -0,0 +1,76 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+
+
+class KeyedWorkerPool:
+    """
+    Ejecuta trabajos en paralelo entre claves distintas y en orden dentro
+    de la misma clave, con un máximo de trabajos simultáneos.
+    `submit` espera (backpressure) cuando hay demasiados trabajos pendientes.
+    """
+
+    def __init__(self, max_workers: int = 10, max_pending: int = 500):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._colas: Dict[Any, Deque[Tuple[Callable[[], Awaitable], asyncio.Future]]] = {}
+        self._workers: Dict[Any, asyncio.Task] = {}
+        self._pendientes = 0
+        self._semaforo = None
+        self._espacio = None
+
+    @property
+    def pending(self) -> int:
+        return self._pendientes
+
+    async def submit(self, key, job: Callable[[], Awaitable]) -> asyncio.Future:
+        """Encola `job` para la clave y retorna un future con su resultado"""
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_workers)
+            self._espacio = asyncio.Condition()
+
+        if self._pendientes >= self.max_pending:
+            async with self._espacio:
+                await self._espacio.wait_for(lambda: self._pendientes < self.max_pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._colas.setdefault(key, deque()).append((job, future))
+        self._pendientes += 1
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._worker(key))
+        return future
+
+    async def _worker(self, key):
+        cola = self._colas[key]
+        try:
+            while cola:
+                job, future = cola.popleft()
+                try:
+                    async with self._semaforo:
+                        resultado = await job()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(resultado)
+                finally:
+                    self._pendientes -= 1
+                    async with self._espacio:
+                        self._espacio.notify_all()
+        finally:
+            for _, future in cola:
+                future.cancel()
+                self._pendientes -= 1
+            self._colas.pop(key, None)
+            self._workers.pop(key, None)
+
+    async def stop(self):
+        for task in list(self._workers.values()):
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
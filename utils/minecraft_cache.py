@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from utils.minecraft_ping import consultar_estado_java, parsear_direccion, MinecraftPingError
+from utils.minecraft_dns import get_resolver
+
+# Caché de estados de Minecraft compartida entre /minecraft_status y el monitor.
+# Los fallos se cachean con un TTL más corto y las consultas simultáneas a la
+# misma dirección comparten un único sondeo.
+
+ERRORES_SONDEO = (asyncio.TimeoutError, OSError, MinecraftPingError)
+
+
+class StatusCache:
+    def __init__(self, ttl: float = 15, ttl_negativo: float = 5, max_entradas: int = 2048, timeout: float = 10):
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.max_entradas = max_entradas
+        self.timeout = timeout
+        self._entradas: "OrderedDict[Tuple[str, Optional[int]], Tuple[float, Optional[dict], Optional[BaseException]]]" = OrderedDict()
+        self._en_vuelo: Dict[Tuple[str, Optional[int]], asyncio.Task] = {}
+        self.stats = {
+            'hits': 0,
+            'hits_negativos': 0,
+            'misses': 0,
+            'deduplicados': 0
+        }
+
+    async def consultar(self, direccion: str) -> Tuple[dict, float]:
+        """
+        Retorna (estado, edad_en_segundos) para la dirección dada.
+        Si el último sondeo falló, relanza el mismo error mientras dure el TTL negativo.
+        Lanza ValueError si la dirección no es válida.
+        """
+        clave = parsear_direccion(direccion, puerto_por_defecto=None)
+        ahora = time.monotonic()
+
+        entrada = self._entradas.get(clave)
+        if entrada:
+            creado, resultado, error = entrada
+            ttl = self.ttl_negativo if error else self.ttl
+            if ahora - creado < ttl:
+                self._entradas.move_to_end(clave)
+                if error:
+                    self.stats['hits_negativos'] += 1
+                    raise error
+                self.stats['hits'] += 1
+                return resultado, ahora - creado
+            del self._entradas[clave]
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea:
+            self.stats['deduplicados'] += 1
+        else:
+            self.stats['misses'] += 1
+            tarea = asyncio.create_task(self._sondear(clave))
+            # Evita avisos de excepción no recuperada si todos los que esperaban se cancelan
+            tarea.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._en_vuelo[clave] = tarea
+
+        resultado = await asyncio.shield(tarea)
+        return resultado, 0.0
+
+    async def _resolver_y_consultar(self, host: str, port: Optional[int]) -> dict:
+        ip, port = await get_resolver().resolver(host, port)
+        return await consultar_estado_java(host, port, timeout=self.timeout, ip=ip)
+
+    async def _sondear(self, clave: Tuple[str, Optional[int]]) -> dict:
+        host, port = clave
+        try:
+            # Un mismo plazo para DNS/SRV y ping: un resolver colgado no frena el sondeo
+            resultado = await asyncio.wait_for(self._resolver_y_consultar(host, port), timeout=self.timeout)
+        except ERRORES_SONDEO as e:
+            self._guardar(clave, None, e)
+            raise
+        else:
+            self._guardar(clave, resultado, None)
+            return resultado
+        finally:
+            self._en_vuelo.pop(clave, None)
+
+    def _guardar(self, clave, resultado: Optional[dict], error: Optional[BaseException]):
+        self._entradas[clave] = (time.monotonic(), resultado, error)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas de la caché"""
+        stats = self.stats.copy()
+        stats['entradas'] = len(self._entradas)
+        stats['en_vuelo'] = len(self._en_vuelo)
+        return stats
+
+
+_cache_instance = None
+
+def get_status_cache() -> StatusCache:
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = StatusCache()
+    return _cache_instance
@@ -0,0 +1,141 @@
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Dict, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+from utils.minecraft_ping import PUERTO_POR_DEFECTO
+
+# Resolución de direcciones de Minecraft con soporte para registros SRV
+# (_minecraft._tcp.<host>) y caché que respeta el TTL de cada respuesta.
+
+
+class MinecraftResolver:
+    def __init__(
+        self,
+        ttl_min: float = 30,
+        ttl_max: float = 3600,
+        ttl_sin_srv: float = 300,
+        timeout: float = 5,
+        max_entradas: int = 4096
+    ):
+        self.ttl_min = ttl_min
+        self.ttl_max = ttl_max
+        self.ttl_sin_srv = ttl_sin_srv
+        self.timeout = timeout
+        self.max_entradas = max_entradas
+        self._resolver = dns.asyncresolver.Resolver()
+        self._cache: Dict[Tuple[str, str], Tuple[float, object]] = {}
+        self.stats = {
+            'hits': 0,
+            'misses': 0
+        }
+
+    def _ttl(self, ttl: float) -> float:
+        return min(max(ttl, self.ttl_min), self.ttl_max)
+
+    def _leer(self, clave: Tuple[str, str]):
+        entrada = self._cache.get(clave)
+        if entrada and entrada[0] > time.monotonic():
+            self.stats['hits'] += 1
+            return True, entrada[1]
+        self._cache.pop(clave, None)
+        self.stats['misses'] += 1
+        return False, None
+
+    def _guardar(self, clave: Tuple[str, str], valor, ttl: float):
+        ahora = time.monotonic()
+        if len(self._cache) >= self.max_entradas:
+            for vieja in [c for c, (expira, _) in self._cache.items() if expira <= ahora]:
+                del self._cache[vieja]
+            if len(self._cache) >= self.max_entradas:
+                self._cache.pop(next(iter(self._cache)))
+        self._cache[clave] = (ahora + ttl, valor)
+
+    async def _srv(self, host: str) -> Optional[Tuple[str, int]]:
+        clave = ("SRV", host)
+        encontrado, valor = self._leer(clave)
+        if encontrado:
+            return valor
+
+        try:
+            respuesta = await self._resolver.resolve(f"_minecraft._tcp.{host}", "SRV", lifetime=self.timeout)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            self._guardar(clave, None, self.ttl_sin_srv)
+            return None
+        except dns.exception.DNSException:
+            # Error transitorio: no cachear y seguir sin SRV
+            return None
+
+        registro = min(respuesta, key=lambda r: (r.priority, -r.weight))
+        valor = (str(registro.target).rstrip(".").lower(), registro.port)
+        self._guardar(clave, valor, self._ttl(respuesta.rrset.ttl))
+        return valor
+
+    async def _ip(self, host: str) -> str:
+        clave = ("A", host)
+        encontrado, valor = self._leer(clave)
+        if encontrado:
+            return valor
+
+        for tipo in ("A", "AAAA"):
+            try:
+                respuesta = await self._resolver.resolve(host, tipo, lifetime=self.timeout)
+            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+                continue
+            except dns.exception.DNSException as e:
+                raise socket.gaierror(f"Error resolviendo {host}: {e}")
+            ip = respuesta[0].address
+            self._guardar(clave, ip, self._ttl(respuesta.rrset.ttl))
+            return ip
+
+        # Nombres fuera del DNS (p.ej. /etc/hosts): resolver del sistema, sin TTL propio
+        infos = await asyncio.wait_for(
+            asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM),
+            timeout=self.timeout
+        )
+        ip = infos[0][4][0]
+        self._guardar(clave, ip, self.ttl_min)
+        return ip
+
+    async def resolver(self, host: str, port: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Resuelve (host, puerto) a (ip, puerto) para conectar.
+        Si no se indicó puerto se consulta el registro SRV del host.
+        Lanza socket.gaierror (OSError) si el host no existe y
+        asyncio.TimeoutError si la resolución supera `timeout`.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return host, port or PUERTO_POR_DEFECTO
+        except ValueError:
+            pass
+
+        destino = host
+        if port is None:
+            srv = await self._srv(host)
+            if srv:
+                destino, port = srv
+            else:
+                port = PUERTO_POR_DEFECTO
+
+        return await self._ip(destino), port
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas de la caché DNS"""
+        stats = self.stats.copy()
+        stats['entradas'] = len(self._cache)
+        return stats
+
+
+_resolver_instance = None
+
+def get_resolver() -> MinecraftResolver:
+    global _resolver_instance
+    if _resolver_instance is None:
+        _resolver_instance = MinecraftResolver()
+    return _resolver_instance
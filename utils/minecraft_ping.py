@@ -0,0 +1,208 @@
+import asyncio
+import json
+import re
+import struct
+import time
+from typing import Optional, Tuple
+
+# Cliente nativo del protocolo Server List Ping (Java Edition):
+# handshake -> status request -> ping, sin depender de APIs externas.
+
+PUERTO_POR_DEFECTO = 25565
+PROTOCOLO_HANDSHAKE = 47
+MAX_RESPUESTA = 2 * 1024 * 1024
+
+_CODIGOS_FORMATO = re.compile(r"§.")
+
+
+class MinecraftPingError(Exception):
+    """Respuesta inválida o inesperada del servidor"""
+
+
+def parsear_direccion(direccion: str, puerto_por_defecto: Optional[int] = PUERTO_POR_DEFECTO) -> Tuple[str, Optional[int]]:
+    """
+    Separa 'host:puerto' en (host, puerto).
+    Si no se indica puerto se usa `puerto_por_defecto` (None para resolver vía SRV).
+    """
+    direccion = direccion.strip()
+    if direccion.startswith("["):
+        host, _, resto = direccion[1:].partition("]")
+        puerto = resto.lstrip(":")
+    elif direccion.count(":") == 1:
+        host, puerto = direccion.split(":", 1)
+    else:
+        host, puerto = direccion, ""
+
+    try:
+        puerto = int(puerto) if puerto else puerto_por_defecto
+    except ValueError:
+        raise ValueError(f"Puerto inválido en '{direccion}'")
+
+    if not host or (puerto is not None and not 0 < puerto < 65536):
+        raise ValueError(f"Dirección inválida: '{direccion}'")
+
+    return host.lower(), puerto
+
+
+def _varint(valor: int) -> bytes:
+    valor &= 0xFFFFFFFF
+    salida = bytearray()
+    while True:
+        byte = valor & 0x7F
+        valor >>= 7
+        if valor:
+            salida.append(byte | 0x80)
+        else:
+            salida.append(byte)
+            return bytes(salida)
+
+
+def _string(texto: str) -> bytes:
+    datos = texto.encode("utf-8")
+    return _varint(len(datos)) + datos
+
+
+def _paquete(packet_id: int, cuerpo: bytes = b"") -> bytes:
+    datos = _varint(packet_id) + cuerpo
+    return _varint(len(datos)) + datos
+
+
+async def _leer_varint(reader: asyncio.StreamReader) -> int:
+    valor = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        valor |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return valor
+    raise MinecraftPingError("VarInt demasiado largo")
+
+
+def _varint_de_bytes(datos: bytes, offset: int) -> Tuple[int, int]:
+    valor = 0
+    for i in range(5):
+        if offset >= len(datos):
+            raise MinecraftPingError("Paquete truncado")
+        byte = datos[offset]
+        offset += 1
+        valor |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return valor, offset
+    raise MinecraftPingError("VarInt demasiado largo")
+
+
+async def _leer_paquete(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    largo = await _leer_varint(reader)
+    if largo <= 0 or largo > MAX_RESPUESTA:
+        raise MinecraftPingError(f"Largo de paquete inválido: {largo}")
+    datos = await reader.readexactly(largo)
+    packet_id, offset = _varint_de_bytes(datos, 0)
+    return packet_id, datos[offset:]
+
+
+def limpiar_motd(descripcion) -> str:
+    """Convierte la descripción (texto o componente de chat) en texto plano"""
+    if isinstance(descripcion, str):
+        texto = descripcion
+    elif isinstance(descripcion, dict):
+        texto = descripcion.get("text", "")
+        for extra in descripcion.get("extra", []) or []:
+            texto += limpiar_motd(extra)
+    elif isinstance(descripcion, list):
+        texto = "".join(limpiar_motd(parte) for parte in descripcion)
+    else:
+        texto = ""
+    return _CODIGOS_FORMATO.sub("", texto)
+
+
+async def _consultar(host: str, port: int, ip: Optional[str] = None) -> Tuple[dict, Optional[int]]:
+    reader, writer = await asyncio.open_connection(ip or host, port)
+    try:
+        handshake = (
+            _varint(PROTOCOLO_HANDSHAKE)
+            + _string(host)
+            + struct.pack(">H", port)
+            + _varint(1)
+        )
+        writer.write(_paquete(0x00, handshake) + _paquete(0x00))
+        await writer.drain()
+
+        packet_id, cuerpo = await _leer_paquete(reader)
+        if packet_id != 0x00:
+            raise MinecraftPingError(f"Paquete inesperado: {packet_id:#x}")
+
+        largo, offset = _varint_de_bytes(cuerpo, 0)
+        try:
+            estado = json.loads(cuerpo[offset:offset + largo].decode("utf-8"))
+        except ValueError as e:
+            raise MinecraftPingError(f"JSON de estado inválido: {e}")
+        if not isinstance(estado, dict):
+            raise MinecraftPingError(f"El estado no es un objeto JSON: {type(estado).__name__}")
+
+        payload = int(time.time() * 1000) & 0x7FFFFFFFFFFFFFFF
+        enviado = time.perf_counter()
+        writer.write(_paquete(0x01, struct.pack(">q", payload)))
+        await writer.drain()
+
+        latencia = None
+        try:
+            packet_id, cuerpo = await _leer_paquete(reader)
+            if packet_id == 0x01 and cuerpo[:8] == struct.pack(">q", payload):
+                latencia = round((time.perf_counter() - enviado) * 1000)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Algunos servidores cierran la conexión sin responder al ping
+            pass
+
+        return estado, latencia
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def consultar_estado_java(
+    host: str,
+    port: int = PUERTO_POR_DEFECTO,
+    timeout: float = 5.0,
+    ip: Optional[str] = None
+) -> dict:
+    """
+    Consulta el estado de un servidor Java Edition.
+    Si se pasa `ip` se conecta a ella, pero el handshake lleva `host`.
+
+    Retorna un dict con online, players, version, motd y latency (ms).
+    Lanza asyncio.TimeoutError si no responde a tiempo, OSError si no se
+    puede conectar y MinecraftPingError si la respuesta no es válida.
+    """
+    try:
+        estado, latencia = await asyncio.wait_for(_consultar(host, port, ip), timeout=timeout)
+    except asyncio.IncompleteReadError:
+        raise MinecraftPingError("El servidor cerró la conexión")
+
+    players = estado.get("players")
+    if not isinstance(players, dict):
+        players = {}
+    version = estado.get("version")
+    if not isinstance(version, dict):
+        version = {}
+    sample = players.get("sample")
+    if not isinstance(sample, list):
+        sample = []
+
+    return {
+        "online": True,
+        "host": host,
+        "port": port,
+        "players": {
+            "online": players.get("online", 0),
+            "max": players.get("max", 0),
+            "sample": [p.get("name") for p in sample if isinstance(p, dict) and p.get("name")]
+        },
+        "version": {
+            "name": limpiar_motd(version.get("name", "Desconocido")),
+            "protocol": version.get("protocol")
+        },
+        "motd": limpiar_motd(estado.get("description", "")),
+        "latency": latencia
+    }
@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class AdaptiveCadence:
+    """
+    Cadencia adaptativa con histéresis para un objetivo monitoreado.
+    Un cambio de estado solo se confirma tras `confirmaciones` sondeos
+    consecutivos iguales; mientras tanto se chequea al intervalo mínimo.
+    Los objetivos estables se espacian hasta el intervalo máximo.
+    """
+
+    def __init__(
+        self,
+        estado: bool = False,
+        confirmaciones: int = 2,
+        minimo: float = 20,
+        maximo: float = 300,
+        factor: float = 1.5,
+        estables: int = 0
+    ):
+        self.estado = estado
+        self.confirmaciones = confirmaciones
+        self.minimo = minimo
+        self.maximo = maximo
+        self.factor = factor
+        self.estables = estables
+        self.pendientes = 0
+
+    @property
+    def intervalo(self) -> float:
+        if self.pendientes:
+            return self.minimo
+        return min(self.minimo * self.factor ** self.estables, self.maximo)
+
+    def registrar(self, observado: bool) -> bool:
+        """Registra un sondeo. Retorna True si el cambio de estado quedó confirmado"""
+        if observado == self.estado:
+            self.pendientes = 0
+            # Ya en el máximo no hace falta seguir contando (y la potencia desbordaría)
+            if self.intervalo < self.maximo:
+                self.estables += 1
+            return False
+
+        self.pendientes += 1
+        if self.pendientes < self.confirmaciones:
+            return False
+
+        self.estado = observado
+        self.pendientes = 0
+        self.estables = 0
+        return True
+
+
+class MonitorScheduler:
+    """
+    Planificador de sondeos con concurrencia acotada.
+    Cada objetivo tiene su propio próximo chequeo, guardado en un heap,
+    así que la duración de un sondeo no retrasa a los demás.
+    El sondeo puede retornar el intervalo hasta su próximo chequeo;
+    si retorna None se usa `interval`.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[Any], Awaitable[Optional[float]]],
+        interval: float = 60,
+        max_concurrent: int = 50
+    ):
+        self.probe = probe
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._objetivos: Dict[Any, int] = {}
+        self._en_curso: Set[Any] = set()
+        self._tareas: Set[asyncio.Task] = set()
+        self._seq = 0
+        self._despertar: Optional[asyncio.Event] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._ultimo_aviso = 0.0
+        self.stats = {
+            'sondeos': 0,
+            'errores': 0,
+            'lag_ultimo': 0.0,
+            'lag_promedio': 0.0,
+            'lag_max': 0.0
+        }
+
+    def start(self):
+        if self._loop_task:
+            return
+        self._despertar = asyncio.Event()
+        self._semaforo = asyncio.Semaphore(self.max_concurrent)
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for tarea in list(self._tareas):
+            tarea.cancel()
+        if self._tareas:
+            await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    def add(self, key, delay: float = 0.0):
+        """Agrega (o reprograma) un objetivo para sondearlo dentro de `delay` segundos"""
+        self._programar(key, asyncio.get_running_loop().time() + delay)
+
+    def remove(self, key):
+        self._objetivos.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        return key in self._objetivos
+
+    def __len__(self) -> int:
+        return len(self._objetivos)
+
+    def _programar(self, key, cuando: float):
+        self._seq += 1
+        self._objetivos[key] = self._seq
+        heapq.heappush(self._heap, (cuando, self._seq, key))
+        if self._despertar:
+            self._despertar.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._despertar.clear()
+                await self._despertar.wait()
+                continue
+
+            cuando, seq, key = self._heap[0]
+            if self._objetivos.get(key) != seq:
+                heapq.heappop(self._heap)
+                continue
+
+            espera = cuando - loop.time()
+            if espera > 0:
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), timeout=espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            await self._semaforo.acquire()
+
+            if self._objetivos.get(key) != seq:
+                self._semaforo.release()
+                continue
+
+            self._registrar_lag(loop.time() - cuando)
+            self._en_curso.add(key)
+            tarea = asyncio.create_task(self._ejecutar(key, seq, cuando))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+    async def _ejecutar(self, key, seq: int, cuando: float):
+        intervalo = None
+        try:
+            intervalo = await self.probe(key)
+            self.stats['sondeos'] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['errores'] += 1
+            print(f"❌ Error sondeando {key}: {e}")
+        finally:
+            self._semaforo.release()
+            self._en_curso.discard(key)
+
+        if self._objetivos.get(key) == seq:
+            ahora = asyncio.get_running_loop().time()
+            # Mantener el ritmo respecto a la hora planificada, sin acumular atraso
+            self._programar(key, max(cuando + (intervalo or self.interval), ahora))
+
+    def _registrar_lag(self, lag: float):
+        lag = max(lag, 0.0)
+        self.stats['lag_ultimo'] = lag
+        self.stats['lag_max'] = max(self.stats['lag_max'], lag)
+        self.stats['lag_promedio'] = self.stats['lag_promedio'] * 0.9 + lag * 0.1
+
+        ahora = asyncio.get_running_loop().time()
+        if lag > self.interval / 2 and ahora - self._ultimo_aviso > 60:
+            self._ultimo_aviso = ahora
+            print(
+                f"⚠️ Monitor atrasado {lag:.1f}s "
+                f"({len(self._objetivos)} objetivos, {len(self._en_curso)} en curso)"
+            )
+
+    def get_stats(self) -> Dict:
+        """Retorna estadísticas del planificador"""
+        stats = self.stats.copy()
+        stats['objetivos'] = len(self._objetivos)
+        stats['en_curso'] = len(self._en_curso)
+        return stats
@@ -1,5 +1,6 @@
 import asyncio
 from utils.jsondb import safe_load
+from utils.despachador import get_despachador, DESACTIVADO, AGRUPADO
 from config import VINCULACIONES_FILE
 
 def obtener_usuario_por_codespace(codespace_name: str):
@@ -23,17 +24,15 @@ async def enviar_log_al_propietario(bot, codespace_name: str, mensaje: str):
         print(f"⚠️ No se encontró propietario para codespace '{codespace_name}'")
         return
 
-    user = bot.get_user(int(user_id))
-    if user is None:
-        # Intentar obtener usuario desde API si no está en caché
-        try:
-            user = await bot.fetch_user(int(user_id))
-        except Exception as e:
-            print(f"❌ Error obteniendo usuario {user_id} desde API: {e}")
-            return
-
-    try:
-        await user.send(f"📡 Notificación de tu Codespace `{codespace_name}`:\n{mensaje}")
-        print(f"✅ Mensaje enviado a propietario <@{user_id}>")
-    except Exception as e:
-        print(f"❌ Error enviando DM a <@{user_id}>: {e}")
+    # El despachador aplica la preferencia del usuario y reintenta si Discord falla
+    resultado = await get_despachador().notificar_usuario(
+        user_id,
+        content=f"📡 Notificación de tu Codespace `{codespace_name}`:\n{mensaje}",
+        origen="log_propietario"
+    )
+    if resultado == DESACTIVADO:
+        print(f"🔕 Notificaciones desactivadas para <@{user_id}>")
+    elif resultado == AGRUPADO:
+        print(f"📬 Mensaje para propietario <@{user_id}> agregado a su resumen")
+    else:
+        print(f"📨 Mensaje para propietario <@{user_id}> encolado")
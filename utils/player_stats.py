@@ -0,0 +1,198 @@
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from utils.minecraft_ping import parsear_direccion
+
+# Serie temporal compacta de jugadores por servidor. Cada muestra se agrega
+# al llegar en tres niveles (minuto, hora, día) guardados en ring buffers
+# de arrays de tamaño fijo, así la memoria por servidor es constante y las
+# consultas recorren buckets ya agregados, no muestras crudas. Cada nivel
+# cubre solo lo que /minecraft_stats no puede pedir al siguiente (más un
+# margen para el bucket parcial del borde): ~24 KB por servidor.
+# Uptime y promedio se ponderan por tiempo: cada muestra vale el tiempo hasta
+# la siguiente, porque la cadencia adaptativa sondea mucho más seguido
+# alrededor de un cambio de estado que con el servidor estable.
+
+NIVELES = (
+    (60, 3 * 60),        # minutos: últimas 3h
+    (3600, 8 * 24),      # horas: últimos 8 días
+    (86400, 366),        # días: último año
+)
+
+# Un hueco mayor entre muestras (bot caído, monitoreo pausado) no se acredita
+MAX_HUECO = 600
+
+
+class _Nivel:
+    """Ring buffer de buckets indexado por número de bucket"""
+
+    def __init__(self, segundos: int, capacidad: int):
+        self.segundos = segundos
+        self.capacidad = capacidad
+        # Número de bucket (t // segundos): en 32 bits alcanza con minutos
+        self.bucket = array('i', [-1]) * capacidad
+        self.muestras = array('I', [0]) * capacidad
+        self.online = array('I', [0]) * capacidad
+        self.cubierto = array('I', [0]) * capacidad
+        self.online_seg = array('I', [0]) * capacidad
+        self.suma = array('Q', [0]) * capacidad
+        self.maximo = array('I', [0]) * capacidad
+
+    def _indice(self, bucket: int) -> Optional[int]:
+        i = bucket % self.capacidad
+        if bucket < self.bucket[i]:
+            # Más viejo que lo que cubre el buffer
+            return None
+        if self.bucket[i] != bucket:
+            self.bucket[i] = bucket
+            self.muestras[i] = 0
+            self.online[i] = 0
+            self.cubierto[i] = 0
+            self.online_seg[i] = 0
+            self.suma[i] = 0
+            self.maximo[i] = 0
+        return i
+
+    def agregar(self, t: int, online: bool, jugadores: int):
+        i = self._indice(t // self.segundos)
+        if i is None:
+            return
+        self.muestras[i] += 1
+        if online:
+            self.online[i] += 1
+            if jugadores > self.maximo[i]:
+                self.maximo[i] = jugadores
+
+    def acreditar(self, desde: int, hasta: int, online: bool, jugadores: int):
+        """Reparte el intervalo [desde, hasta) entre los buckets que toca"""
+        t = desde
+        while t < hasta:
+            bucket = t // self.segundos
+            fin = min(hasta, (bucket + 1) * self.segundos)
+            i = self._indice(bucket)
+            if i is not None:
+                duracion = fin - t
+                self.cubierto[i] += duracion
+                if online:
+                    self.online_seg[i] += duracion
+                    self.suma[i] += jugadores * duracion
+            t = fin
+
+    def resumen(self, desde: int, hasta: int) -> Tuple[int, int, int, int, int, int]:
+        primero = desde // self.segundos
+        ultimo = hasta // self.segundos
+        muestras = online = cubierto = online_seg = suma = maximo = 0
+        for i in range(self.capacidad):
+            if primero <= self.bucket[i] <= ultimo:
+                muestras += self.muestras[i]
+                online += self.online[i]
+                cubierto += self.cubierto[i]
+                online_seg += self.online_seg[i]
+                suma += self.suma[i]
+                maximo = max(maximo, self.maximo[i])
+        return muestras, online, cubierto, online_seg, suma, maximo
+
+
+class SerieJugadores:
+    def __init__(self):
+        self.niveles = [_Nivel(segundos, capacidad) for segundos, capacidad in NIVELES]
+        self._ultima: Optional[Tuple[int, bool, int]] = None
+
+    def agregar(self, t: int, online: bool, jugadores: int):
+        if self._ultima is not None:
+            t_anterior, online_anterior, jugadores_anterior = self._ultima
+            if t < t_anterior:
+                # Muestra desordenada: solo cuenta para el pico
+                for nivel in self.niveles:
+                    nivel.agregar(t, online, jugadores)
+                return
+            hasta = min(t, t_anterior + MAX_HUECO)
+            for nivel in self.niveles:
+                nivel.acreditar(t_anterior, hasta, online_anterior, jugadores_anterior)
+
+        for nivel in self.niveles:
+            nivel.agregar(t, online, jugadores)
+        self._ultima = (t, online, jugadores)
+
+    def resumen(self, segundos: int, ahora: Optional[int] = None) -> Dict:
+        ahora = int(ahora if ahora is not None else time.time())
+        desde = ahora - segundos
+        # Nivel más fino que cubre todo el rango pedido
+        nivel = next(
+            (n for n in self.niveles if n.segundos * n.capacidad >= segundos),
+            self.niveles[-1]
+        )
+        muestras, online, cubierto, online_seg, suma, maximo = nivel.resumen(desde, ahora)
+
+        # La última muestra vale hasta ahora (o hasta MAX_HUECO)
+        if self._ultima is not None:
+            t_ultima, online_ultima, jugadores_ultima = self._ultima
+            duracion = min(ahora, t_ultima + MAX_HUECO) - max(t_ultima, desde)
+            if duracion > 0:
+                cubierto += duracion
+                if online_ultima:
+                    online_seg += duracion
+                    suma += jugadores_ultima * duracion
+
+        if cubierto:
+            uptime = online_seg / cubierto
+            promedio = suma / online_seg if online_seg else 0.0
+        else:
+            uptime = online / muestras if muestras else 0.0
+            promedio = 0.0
+
+        return {
+            "muestras": muestras,
+            "pico": maximo,
+            "promedio": promedio,
+            "uptime": uptime,
+            "resolucion": nivel.segundos
+        }
+
+
+class PlayerStatsStore:
+    """Series de jugadores por dirección, con un máximo de servidores (LRU)"""
+
+    def __init__(self, max_servidores: int = 1000):
+        self.max_servidores = max_servidores
+        self._series: "OrderedDict[str, SerieJugadores]" = OrderedDict()
+
+    @staticmethod
+    def _clave(direccion: str) -> str:
+        host, port = parsear_direccion(direccion)
+        return f"{host}:{port}"
+
+    def registrar(self, direccion: str, online: bool, jugadores: int = 0, t: Optional[float] = None):
+        try:
+            clave = self._clave(direccion)
+        except ValueError:
+            return
+
+        serie = self._series.get(clave)
+        if serie is None:
+            serie = SerieJugadores()
+            self._series[clave] = serie
+            while len(self._series) > self.max_servidores:
+                self._series.popitem(last=False)
+        self._series.move_to_end(clave)
+
+        serie.agregar(int(t if t is not None else time.time()), online, max(int(jugadores or 0), 0))
+
+    def resumen(self, direccion: str, segundos: int) -> Optional[Dict]:
+        """Retorna pico, promedio y uptime del rango, o None si no hay datos"""
+        serie = self._series.get(self._clave(direccion))
+        if serie is None:
+            return None
+        resumen = serie.resumen(segundos)
+        return resumen if resumen["muestras"] else None
+
+
+_store_instance = None
+
+def get_player_stats() -> PlayerStatsStore:
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = PlayerStatsStore()
+    return _store_instance
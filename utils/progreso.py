@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Optional
+
+import discord
+
+# Mensaje de progreso para comandos de varias fases. Cada edición es una
+# llamada REST con rate limit, así que las actualizaciones se agrupan: se
+# edita como mucho una vez por intervalo, siempre con el último embed
+# pendiente, y se omiten las ediciones que no cambian nada. `finalizar`
+# garantiza que el estado final quede publicado.
+
+
+def _firma(embed: discord.Embed) -> dict:
+    datos = embed.to_dict()
+    # El timestamp cambia en cada embed nuevo aunque el contenido sea igual
+    datos.pop("timestamp", None)
+    return datos
+
+
+class MensajeProgreso:
+    def __init__(self, mensaje, intervalo: float = 1.5):
+        self.mensaje = mensaje
+        self.intervalo = intervalo
+        self._pendiente: Optional[discord.Embed] = None
+        self._publicado = _firma(mensaje.embeds[0]) if getattr(mensaje, "embeds", None) else None
+        self._ultima_edicion = time.monotonic()
+        self._tarea: Optional[asyncio.Task] = None
+        self._editando = False
+        self.ediciones = 0
+        self.omitidas = 0
+
+    def actualizar(self, embed: discord.Embed):
+        """Programa la edición; si ya hay una pendiente solo reemplaza el embed"""
+        self._pendiente = embed
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._publicar_con_espera())
+
+    async def finalizar(self, embed: Optional[discord.Embed] = None):
+        """Publica el estado final (o el último pendiente) respetando el intervalo"""
+        if embed is not None:
+            self._pendiente = embed
+
+        if self._tarea and not self._tarea.done():
+            if self._editando:
+                await asyncio.gather(self._tarea, return_exceptions=True)
+            else:
+                self._tarea.cancel()
+                await asyncio.gather(self._tarea, return_exceptions=True)
+
+        await self._publicar_con_espera()
+
+    async def _publicar_con_espera(self):
+        # Un actualizar() durante la edición solo deja el embed en _pendiente
+        # porque la tarea sigue viva: se publica en la siguiente vuelta
+        while self._pendiente is not None:
+            espera = self._ultima_edicion + self.intervalo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            await self._publicar()
+
+    async def _publicar(self):
+        embed, self._pendiente = self._pendiente, None
+        if embed is None:
+            return
+
+        firma = _firma(embed)
+        if firma == self._publicado:
+            self.omitidas += 1
+            return
+
+        self._editando = True
+        try:
+            await self.mensaje.edit(embed=embed)
+            self._publicado = firma
+            self.ediciones += 1
+        except discord.HTTPException as e:
+            print(f"⚠️ No se pudo actualizar el mensaje de progreso: {e}")
+        finally:
+            self._ultima_edicion = time.monotonic()
+            self._editando = False
@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import discord
+
+# Resolución de usuarios y canales sin gastar llamadas REST: primero la caché
+# del gateway (get_user / get_channel), luego una caché local con TTL de lo
+# que ya se pidió por API, y solo al final fetch_user / fetch_channel.
+# Los canales de DM también se cachean: enviar a un usuario obtenido por
+# fetch_user crearía el DM con otra llamada REST en cada mensaje.
+
+
+class _CacheTTL:
+    def __init__(self, ttl: float, max_entradas: int):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, clave: int):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        expira, valor = entrada
+        if expira <= time.monotonic():
+            del self._entradas[clave]
+            return None
+        self._entradas.move_to_end(clave)
+        return valor
+
+    def set(self, clave: int, valor):
+        self._entradas[clave] = (time.monotonic() + self.ttl, valor)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class DiscordResolver:
+    def __init__(self, ttl: float = 3600, max_entradas: int = 5000):
+        self.bot = None
+        self._usuarios = _CacheTTL(ttl, max_entradas)
+        self._dms = _CacheTTL(ttl, max_entradas)
+        self._canales = _CacheTTL(ttl, max_entradas)
+        self.stats = {
+            tipo: {'gateway': 0, 'cache': 0, 'rest': 0}
+            for tipo in ('usuario', 'dm', 'canal')
+        }
+
+    def configurar(self, bot):
+        self.bot = bot
+
+    async def usuario(self, user_id) -> discord.User:
+        user_id = int(user_id)
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            self.stats['usuario']['gateway'] += 1
+            return user
+
+        user = self._usuarios.get(user_id)
+        if user is not None:
+            self.stats['usuario']['cache'] += 1
+            return user
+
+        self.stats['usuario']['rest'] += 1
+        user = await self.bot.fetch_user(user_id)
+        self._usuarios.set(user_id, user)
+        return user
+
+    async def canal_dm(self, user_id) -> discord.DMChannel:
+        user_id = int(user_id)
+        dm = self._dms.get(user_id)
+        if dm is not None:
+            self.stats['dm']['cache'] += 1
+            return dm
+
+        user = await self.usuario(user_id)
+        dm = user.dm_channel
+        if dm is not None:
+            self.stats['dm']['gateway'] += 1
+        else:
+            self.stats['dm']['rest'] += 1
+            dm = await user.create_dm()
+        self._dms.set(user_id, dm)
+        return dm
+
+    async def canal(self, channel_id):
+        channel_id = int(channel_id)
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            self.stats['canal']['gateway'] += 1
+            return channel
+
+        channel = self._canales.get(channel_id)
+        if channel is not None:
+            self.stats['canal']['cache'] += 1
+            return channel
+
+        self.stats['canal']['rest'] += 1
+        channel = await self.bot.fetch_channel(channel_id)
+        self._canales.set(channel_id, channel)
+        return channel
+
+    def tasa_aciertos(self, tipo: str) -> Optional[float]:
+        """Fracción de resoluciones que no necesitaron REST (None si no hubo ninguna)"""
+        contador = self.stats[tipo]
+        total = sum(contador.values())
+        if not total:
+            return None
+        return (contador['gateway'] + contador['cache']) / total
+
+    def get_stats(self) -> Dict:
+        stats = {tipo: contador.copy() for tipo, contador in self.stats.items()}
+        for tipo in stats:
+            stats[tipo]['tasa_aciertos'] = self.tasa_aciertos(tipo)
+        stats['entradas'] = len(self._usuarios) + len(self._dms) + len(self._canales)
+        return stats
+
+
+_resolver_instance = None
+
+def get_discord_resolver() -> DiscordResolver:
+    global _resolver_instance
+    if _resolver_instance is None:
+        _resolver_instance = DiscordResolver()
+    return _resolver_instance
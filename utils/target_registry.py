@@ -0,0 +1,127 @@
+import asyncio
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from utils.jsondb import safe_load
+from config import SESIONES_FILE
+
+# Registro de URLs de Codespaces a consultar por el consumer de eventos.
+# Se carga una vez desde sesiones.json y la base de datos, y después se
+# actualiza con cada escritura de sesión (webhook del túnel, /setup,
+# /minecraft_start) en vez de releer todo el almacenamiento en cada ciclo.
+# Las escrituras pueden venir de otros hilos: los cambios se aplican con un
+# lock y los avisos a los suscriptores se entregan en el loop del bot.
+
+
+def url_de_sesion(data: Optional[dict]) -> Optional[str]:
+    """URL del consumer para una sesión: túnel de Cloudflare o Codespace nativo"""
+    if not data:
+        return None
+
+    # Prioridad 1: URL de Cloudflare Tunnel
+    tunnel_url = data.get('tunnel_url')
+    if tunnel_url:
+        return tunnel_url
+
+    # Fallback: URL de Codespace nativa
+    codespace_url = data.get('codespace_url')
+    if codespace_url:
+        if not codespace_url.startswith('http'):
+            codespace_url = f'https://{codespace_url}'
+        if not codespace_url.endswith(':8080'):
+            codespace_url = codespace_url.rstrip('/') + ':8080'
+        return codespace_url
+    return None
+
+
+class TargetRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_usuario: Dict[str, str] = {}
+        self._referencias: Counter = Counter()
+        self._suscriptores: List[Callable[[str, str], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cargado = False
+
+    def cargar(self):
+        """Carga inicial desde sesiones.json y la base de datos (una sola vez)"""
+        if self._cargado:
+            return
+        self._cargado = True
+
+        # En la carga inicial una sesión sin URL no quita la que dio la otra fuente
+        for uid, data in safe_load(SESIONES_FILE).items():
+            if url_de_sesion(data):
+                self.actualizar(uid, data)
+
+        try:
+            from utils.database import get_db
+            db = get_db()
+            for uid, data in db.get_all_sesiones().items():
+                if url_de_sesion(data):
+                    self.actualizar(uid, data)
+            db.suscribir_cambios_sesion(self.actualizar)
+        except Exception as e:
+            print(f"⚠️ Registro de Codespaces sin base de datos: {e}")
+
+    def suscribir(self, callback: Callable[[str, str], None]):
+        """
+        Registra `callback(evento, url)` con evento 'alta' o 'baja'.
+        Se invoca siempre dentro del loop de asyncio del bot.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._suscriptores.append(callback)
+
+    def desuscribir(self, callback: Callable[[str, str], None]):
+        if callback in self._suscriptores:
+            self._suscriptores.remove(callback)
+
+    def actualizar(self, user_id, data: Optional[dict]):
+        """
+        Aplica el alta o cambio de URL de la sesión de un usuario, o su baja
+        si data es None o la sesión quedó sin URL (p. ej. se borró tunnel_url).
+        """
+        user_id = str(user_id)
+        nueva = url_de_sesion(data)
+
+        eventos = []
+        with self._lock:
+            anterior = self._por_usuario.get(user_id)
+            if anterior == nueva:
+                return
+
+            if anterior:
+                self._referencias[anterior] -= 1
+                if self._referencias[anterior] <= 0:
+                    del self._referencias[anterior]
+                    eventos.append(('baja', anterior))
+            if nueva:
+                self._por_usuario[user_id] = nueva
+                self._referencias[nueva] += 1
+                if self._referencias[nueva] == 1:
+                    eventos.append(('alta', nueva))
+            else:
+                self._por_usuario.pop(user_id, None)
+
+        for evento, url in eventos:
+            self._notificar(evento, url)
+
+    def _notificar(self, evento: str, url: str):
+        if not self._loop or self._loop.is_closed():
+            return
+        for callback in list(self._suscriptores):
+            self._loop.call_soon_threadsafe(callback, evento, url)
+
+    def urls(self) -> List[str]:
+        with self._lock:
+            return list(self._referencias)
+
+
+_registry_instance = None
+
+def get_target_registry() -> TargetRegistry:
+    global _registry_instance
+    if _registry_instance is None:
+        _registry_instance = TargetRegistry()
+    return _registry_instance
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+from typing import Awaitable, Dict, List, Optional, Tuple
+
+# Registro en memoria de túneles listos. El webhook /webhook/tunnel_notify
+# lo señaliza y los comandos (/start, /minecraft_start) lo esperan con un
+# deadline en lugar de dormir un tiempo fijo.
+
+_lock = threading.Lock()
+_ultimos: Dict[str, Tuple[float, Optional[str], dict]] = {}
+_esperas: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future, Optional[str]]]] = {}
+
+
+def notificar_tunnel(user_id, codespace: Optional[str], datos: dict):
+    """
+    Señaliza que el túnel de un usuario/codespace está listo.
+    Puede llamarse desde cualquier hilo o desde el propio loop del bot.
+    """
+    user_id = str(user_id)
+    with _lock:
+        _ultimos[user_id] = (time.monotonic(), codespace, datos)
+        pendientes = _esperas.get(user_id, [])
+        restantes = []
+        despertar = []
+        for loop, future, cs in pendientes:
+            if cs is None or codespace is None or cs == codespace:
+                despertar.append((loop, future))
+            else:
+                restantes.append((loop, future, cs))
+        if restantes:
+            _esperas[user_id] = restantes
+        else:
+            _esperas.pop(user_id, None)
+
+    for loop, future in despertar:
+        loop.call_soon_threadsafe(_resolver, future, datos)
+
+
+def _resolver(future: asyncio.Future, datos: dict):
+    if not future.done():
+        future.set_result(datos)
+
+
+def marca_tiempo() -> float:
+    """Devuelve una marca para usar como `desde` en esperar_tunnel"""
+    return time.monotonic()
+
+
+async def esperar_tunnel(
+    user_id,
+    codespace: Optional[str] = None,
+    timeout: float = 120,
+    desde: Optional[float] = None
+) -> Optional[dict]:
+    """
+    Espera a que llegue la notificación del túnel para el usuario/codespace.
+    Si ya llegó una después de `desde`, retorna inmediatamente.
+    Retorna los datos del webhook o None si vence el deadline.
+    """
+    user_id = str(user_id)
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    entrada = (loop, future, codespace)
+
+    with _lock:
+        ultimo = _ultimos.get(user_id)
+        if ultimo and desde is not None and ultimo[0] >= desde:
+            _, cs, datos = ultimo
+            if codespace is None or cs is None or cs == codespace:
+                return datos
+        _esperas.setdefault(user_id, []).append(entrada)
+
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        with _lock:
+            pendientes = _esperas.get(user_id)
+            if pendientes and entrada in pendientes:
+                pendientes.remove(entrada)
+                if not pendientes:
+                    _esperas.pop(user_id, None)
+
+
+async def primer_tunnel(
+    user_id,
+    codespace: Optional[str],
+    sondeo: Awaitable[Optional[str]],
+    timeout: float = 60,
+    desde: Optional[float] = None
+) -> Optional[str]:
+    """
+    Espera la notificación del túnel y a la vez corre `sondeo` (p. ej. el
+    polling de /get_url), que cubre el caso en que el webhook no llega.
+    Retorna la primera URL de túnel que aparezca, o None si ninguno la da.
+    """
+    async def _desde_webhook():
+        datos = await esperar_tunnel(user_id, codespace, timeout=timeout, desde=desde)
+        return datos.get("tunnel_url") if datos else None
+
+    pendientes = {asyncio.ensure_future(_desde_webhook()), asyncio.ensure_future(sondeo)}
+    try:
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in hechas:
+                if not tarea.cancelled() and tarea.exception() is None and tarea.result():
+                    return tarea.result()
+        return None
+    finally:
+        for tarea in pendientes:
+            tarea.cancel()
+        await asyncio.gather(*pendientes, return_exceptions=True)
@@ -0,0 +1,39 @@
+import json
+
+from aiohttp import web
+
+from utils.firma_webhook import get_verificador_firmas, CABECERA_TIMESTAMP, CABECERA_FIRMA
+
+# Middleware que exige la firma HMAC en los webhooks del Codespace. Va
+# después del límite por IP y de concurrencia (web/rate_limit.py), así que
+# un flood de peticiones falsificadas también queda limitado, y antes del
+# bucket por usuario, que solo cobra peticiones con firma válida.
+# Sin WEBHOOK_SECRET no verifica nada.
+
+# Solo rutas cuyo emisor ya firma (el startup.sh generado por /setup);
+# /webhook/megacmd se agregará cuando su script firme las peticiones
+RUTAS_FIRMADAS = ("/webhook/tunnel_notify",)
+
+
+@web.middleware
+async def verificar_firma(request: web.Request, handler):
+    verificador = get_verificador_firmas()
+    if not verificador.activo or request.method != "POST" or request.path not in RUTAS_FIRMADAS:
+        return await handler(request)
+
+    # aiohttp guarda el cuerpo leído, el handler puede volver a leerlo
+    cuerpo = await request.read()
+    try:
+        user_id = json.loads(cuerpo).get("user_id")
+    except (ValueError, AttributeError):
+        user_id = None
+
+    error = verificador.verificar(
+        user_id,
+        request.headers.get(CABECERA_TIMESTAMP),
+        request.headers.get(CABECERA_FIRMA),
+        cuerpo
+    )
+    if error:
+        return web.json_response({"error": error}, status=401)
+    return await handler(request)
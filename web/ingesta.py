@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+# Cola de ingesta de webhooks: el handler HTTP valida el payload, encola el
+# trabajo y responde 202 al momento; un pool de workers hace la escritura en
+# la base de datos y deja la notificación en el outbox (ver web/outbox.py).
+# Si la cola está llena el handler debe responder 503 para que el Codespace
+# reintente más tarde.
+
+
+class ColaIngesta:
+    def __init__(self, workers: int = 4, max_pendientes: int = 1000):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self._cola: Optional[asyncio.Queue] = None
+        self._tareas = []
+        self.stats = {
+            'aceptados': 0,
+            'rechazados': 0,
+            'procesados': 0,
+            'fallidos': 0,
+            'espera_max': 0.0,
+            'espera_total': 0.0,
+            'proceso_total': 0.0
+        }
+
+    def start(self):
+        if self._cola is None:
+            self._cola = asyncio.Queue(maxsize=self.max_pendientes)
+        if not self._tareas:
+            self._tareas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Procesa lo que quede en cola y detiene los workers"""
+        if self._cola is not None and self._tareas:
+            await self._cola.join()
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    def encolar(self, nombre: str, trabajo: Callable[[], Awaitable]) -> bool:
+        """Encola el trabajo; retorna False si la cola está llena"""
+        if self._cola is None:
+            self.start()
+        try:
+            self._cola.put_nowait((nombre, trabajo, time.monotonic()))
+        except asyncio.QueueFull:
+            self.stats['rechazados'] += 1
+            return False
+        self.stats['aceptados'] += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            nombre, trabajo, encolado = await self._cola.get()
+            inicio = time.monotonic()
+            espera = inicio - encolado
+            self.stats['espera_total'] += espera
+            self.stats['espera_max'] = max(self.stats['espera_max'], espera)
+            try:
+                await trabajo()
+                self.stats['procesados'] += 1
+            except Exception as e:
+                self.stats['fallidos'] += 1
+                print(f"❌ Error procesando {nombre}: {e}")
+            finally:
+                self.stats['proceso_total'] += time.monotonic() - inicio
+                self._cola.task_done()
+
+    def get_stats(self) -> Dict:
+        terminados = self.stats['procesados'] + self.stats['fallidos']
+        return {
+            'pendientes': self._cola.qsize() if self._cola else 0,
+            'capacidad': self.max_pendientes,
+            'workers': len(self._tareas),
+            'aceptados': self.stats['aceptados'],
+            'rechazados': self.stats['rechazados'],
+            'procesados': self.stats['procesados'],
+            'fallidos': self.stats['fallidos'],
+            'espera_promedio_ms': round(self.stats['espera_total'] / terminados * 1000, 1) if terminados else 0.0,
+            'espera_max_ms': round(self.stats['espera_max'] * 1000, 1),
+            'proceso_promedio_ms': round(self.stats['proceso_total'] / terminados * 1000, 1) if terminados else 0.0
+        }
+
+
+_cola_instance = None
+
+def get_cola_ingesta() -> ColaIngesta:
+    global _cola_instance
+    if _cola_instance is None:
+        _cola_instance = ColaIngesta()
+    return _cola_instance
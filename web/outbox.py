@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+
+from utils.database import get_db, en_hilo_db
+
+# Relay del outbox de webhooks. Los workers de ingesta escriben cada webhook
+# aceptado en webhook_outbox (en la misma transacción que la sesión, si la
+# hay) y este relay lo entrega después. Cada entrada se toma con un lease: si
+# el proceso muere a mitad del envío, el lease vence y la entrada vuelve a
+# estar disponible tras el reinicio o para otra réplica.
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        intervalo: float = 10,
+        lease: float = 60,
+        lote: int = 5,
+        base: float = 15,
+        max_intentos: int = 10
+    ):
+        self.intervalo = intervalo
+        self.lease = lease
+        self.lote = lote
+        self.base = base
+        self.max_intentos = max_intentos
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._bot_getter: Optional[Callable] = None
+        self._handlers: Dict[str, Callable[[dict], Awaitable]] = {}
+        self._despertar: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'entregados': 0,
+            'reintentos': 0,
+            'descartados': 0
+        }
+
+    def configurar(self, bot_getter: Callable):
+        self._bot_getter = bot_getter
+
+    def registrar(self, tipo: str, handler: Callable[[dict], Awaitable]):
+        """Registra el handler que entrega las entradas de un tipo de webhook"""
+        self._handlers[tipo] = handler
+
+    def start(self):
+        if self._despertar is None:
+            self._despertar = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def despertar(self):
+        """Adelanta la próxima pasada (tras escribir una entrada nueva)"""
+        if self._despertar is not None:
+            self._despertar.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.procesar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error drenando webhook_outbox: {e}")
+            try:
+                await asyncio.wait_for(self._despertar.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._despertar.clear()
+
+    def _bot_listo(self) -> bool:
+        bot = self._bot_getter() if self._bot_getter else None
+        return bot is not None and bot.is_ready()
+
+    async def procesar(self):
+        if not self._bot_listo():
+            return
+
+        while True:
+            # Pocas entradas por lease y entregadas a la vez: si se entregaran
+            # una tras otra, las últimas podrían vencer su lease antes de
+            # salir y otra réplica las enviaría de nuevo
+            entradas = await self._db("arrendar_outbox", self.owner, self.lease, self.lote)
+            if not entradas:
+                return
+            resultados = await asyncio.gather(
+                *(self._entregar(entrada) for entrada in entradas),
+                return_exceptions=True
+            )
+            for entrada, resultado in zip(entradas, resultados):
+                if isinstance(resultado, Exception):
+                    print(f"❌ Error entregando entrada {entrada['id']} de webhook_outbox: {resultado}")
+            if len(entradas) < self.lote:
+                return
+
+    async def _db(self, metodo: str, *args):
+        # psycopg2 es bloqueante: las llamadas van al hilo de la base de datos
+        return await en_hilo_db(lambda: getattr(get_db(), metodo)(*args))
+
+    async def _entregar(self, entrada: dict):
+        handler = self._handlers.get(entrada["tipo"])
+        if handler is None:
+            print(f"⚠️ Entrada {entrada['id']} de webhook_outbox sin handler ({entrada['tipo']}), descartada")
+            await self._db("completar_outbox", entrada["id"], self.owner)
+            self.stats['descartados'] += 1
+            return
+
+        try:
+            await handler(json.loads(entrada["payload"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            intentos = entrada.get("intentos", 0) + 1
+            if intentos >= self.max_intentos:
+                print(f"❌ Entrada {entrada['id']} de webhook_outbox descartada tras {intentos} intentos: {e}")
+                await self._db("completar_outbox", entrada["id"], self.owner)
+                self.stats['descartados'] += 1
+                return
+            espera = self.base * 2 ** (intentos - 1)
+            await self._db("reprogramar_outbox", entrada["id"], self.owner, espera, f"{type(e).__name__}: {e}"[:500])
+            self.stats['reintentos'] += 1
+            print(f"⏳ Entrada {entrada['id']} de webhook_outbox reintentará en {espera:.0f}s: {e}")
+            return
+
+        await self._db("completar_outbox", entrada["id"], self.owner)
+        self.stats['entregados'] += 1
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.copy()
+        try:
+            stats['pendientes'] = get_db().contar_outbox()
+        except Exception:
+            stats['pendientes'] = None
+        return stats
+
+
+_relay_instance = None
+
+def get_outbox_relay() -> OutboxRelay:
+    global _relay_instance
+    if _relay_instance is None:
+        _relay_instance = OutboxRelay()
+    return _relay_instance
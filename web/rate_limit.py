@@ -0,0 +1,169 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from config import TRUST_PROXY
+
+# Límites para los endpoints públicos, aplicados como middleware antes de que
+# el handler toque la base de datos: un token bucket por IP de origen, otro
+# por user_id y un tope global de peticiones en curso. Lo que excede un
+# bucket recibe 429 y lo que excede el tope recibe 503, ambos con
+# Retry-After para que startup.sh sepa cuándo reintentar.
+
+PREFIJOS_LIMITADOS = ("/webhook/", "/api/")
+MAX_CUERPO_USUARIO = 64 * 1024
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'actualizado')
+
+    def __init__(self, tokens: float, actualizado: float):
+        self.tokens = tokens
+        self.actualizado = actualizado
+
+
+class LimitadorTasa:
+    def __init__(self, capacidad: float, por_segundo: float, max_claves: int = 10000):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.max_claves = max_claves
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+
+    def consumir(self, clave: str) -> float:
+        """Retorna 0 si hay token disponible, o los segundos hasta el próximo"""
+        ahora = time.monotonic()
+        bucket = self._buckets.get(clave)
+        if bucket is None:
+            bucket = _Bucket(self.capacidad, ahora)
+            self._buckets[clave] = bucket
+            while len(self._buckets) > self.max_claves:
+                self._buckets.popitem(last=False)
+        else:
+            bucket.tokens = min(self.capacidad, bucket.tokens + (ahora - bucket.actualizado) * self.por_segundo)
+            bucket.actualizado = ahora
+            self._buckets.move_to_end(clave)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.por_segundo
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def ip_origen(request: web.Request, confiar_proxy: bool = TRUST_PROXY) -> str:
+    # Detrás del proxy de Render la IP real es la última que agrega el proxy;
+    # las anteriores las puede poner el cliente. Sin proxy la cabecera
+    # entera viene del cliente y no se usa
+    if confiar_proxy:
+        reenviado = request.headers.get("X-Forwarded-For")
+        if reenviado:
+            return reenviado.split(",")[-1].strip()
+    return request.remote or "desconocida"
+
+
+async def user_id_de(request: web.Request) -> Optional[str]:
+    user_id = request.match_info.get("discord_user_id")
+    if user_id:
+        return user_id
+
+    if request.method != "POST" or request.content_type != "application/json":
+        return None
+    if request.content_length is None or request.content_length > MAX_CUERPO_USUARIO:
+        return None
+    try:
+        # aiohttp guarda el cuerpo leído, el handler puede volver a leerlo
+        data = await request.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    user_id = data.get("user_id") or data.get("discord_user_id")
+    return str(user_id) if user_id else None
+
+
+def _rechazo(status: int, mensaje: str, espera: float) -> web.Response:
+    return web.json_response(
+        {"error": mensaje},
+        status=status,
+        headers={"Retry-After": str(max(1, int(espera + 0.999)))}
+    )
+
+
+class ControlCarga:
+    def __init__(
+        self,
+        ip_capacidad: float = 20,
+        ip_por_segundo: float = 0.5,
+        usuario_capacidad: float = 10,
+        usuario_por_segundo: float = 0.2,
+        max_concurrentes: int = 32,
+        confiar_proxy: bool = TRUST_PROXY
+    ):
+        self.confiar_proxy = confiar_proxy
+        self.por_ip = LimitadorTasa(ip_capacidad, ip_por_segundo)
+        self.por_usuario = LimitadorTasa(usuario_capacidad, usuario_por_segundo)
+        self.max_concurrentes = max_concurrentes
+        self.en_curso = 0
+        self.stats = {
+            'limitados_ip': 0,
+            'limitados_usuario': 0,
+            'descartados_carga': 0
+        }
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if not request.path.startswith(PREFIJOS_LIMITADOS):
+            return await handler(request)
+
+        if self.en_curso >= self.max_concurrentes:
+            self.stats['descartados_carga'] += 1
+            return _rechazo(503, "Servidor ocupado, reintenta más tarde", 1)
+
+        espera = self.por_ip.consumir(ip_origen(request, self.confiar_proxy))
+        if espera:
+            self.stats['limitados_ip'] += 1
+            return _rechazo(429, "Demasiadas peticiones desde esta IP", espera)
+
+        self.en_curso += 1
+        try:
+            return await handler(request)
+        finally:
+            self.en_curso -= 1
+
+    @web.middleware
+    async def middleware_usuario(self, request: web.Request, handler):
+        """
+        Bucket por user_id. Va después de verificar_firma (web/firma.py):
+        si se cobrara antes, peticiones falsificadas con el user_id de otro
+        agotarían su bucket y bloquearían su startup.sh.
+        """
+        if not request.path.startswith(PREFIJOS_LIMITADOS):
+            return await handler(request)
+
+        user_id = await user_id_de(request)
+        if user_id:
+            espera = self.por_usuario.consumir(user_id)
+            if espera:
+                self.stats['limitados_usuario'] += 1
+                return _rechazo(429, "Demasiadas peticiones para este usuario", espera)
+        return await handler(request)
+
+    def get_stats(self) -> Dict:
+        stats = self.stats.copy()
+        stats['en_curso'] = self.en_curso
+        stats['ips'] = len(self.por_ip)
+        stats['usuarios'] = len(self.por_usuario)
+        return stats
+
+
+_control_instance = None
+
+def get_control_carga() -> ControlCarga:
+    global _control_instance
+    if _control_instance is None:
+        _control_instance = ControlCarga()
+    return _control_instance
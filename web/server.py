@@ -1,11 +1,33 @@
-from flask import Flask, request, jsonify
-from utils.database import get_db
+from aiohttp import web
+from utils.database import get_db, en_hilo_db
+from utils.tunnel_ready import notificar_tunnel
+from utils.entregas import get_entregas, ENVIADO
+from utils.despachador import get_despachador, DESACTIVADO
+from utils.event_dedup import get_event_store
+from utils.minecraft_cache import get_status_cache
+from utils.minecraft_dns import get_resolver
+from utils.resolver_discord import get_discord_resolver
+from web.webhook_handler import registrar_webhooks
+from web.ingesta import get_cola_ingesta
+from web.outbox import get_outbox_relay
+from web.rate_limit import get_control_carga
+from web.firma import verificar_firma
+from utils.firma_webhook import get_verificador_firmas
 from datetime import datetime
-import asyncio
+import discord
+import hashlib
+import json
+import time
 
-app = Flask(__name__)
+routes = web.RouteTableDef()
 bot_instance = None
 
+# Caché de /api/user/config: se invalida cuando cambia la sesión y el TTL
+# cubre cambios que no pasan por save_sesion/delete_sesion
+CONFIG_CACHE_TTL = 300
+_config_cache = {}
+_config_stats = {'aciertos': 0, 'fallos': 0, 'no_modificados': 0}
+
 def set_bot(bot):
     global bot_instance
     bot_instance = bot
@@ -13,33 +35,74 @@ def set_bot(bot):
 def get_bot():
     return bot_instance
 
-@app.route('/api/user/config/<discord_user_id>', methods=['GET'])
-def get_user_config(discord_user_id):
+async def leer_json(request: web.Request):
+    """Retorna el cuerpo JSON o None si no es válido"""
     try:
-        db = get_db()
-        sesion = db.get_sesion(discord_user_id)
+        return await request.json()
+    except ValueError:
+        return None
+
+def invalidar_config(user_id, data=None):
+    """Oyente de cambios de sesión (ver Database.suscribir_cambios_sesion)"""
+    _config_cache.pop(str(user_id), None)
+
+def _leer_sesion(user_id):
+    return get_db().get_sesion(user_id)
+
+async def _cargar_config(discord_user_id: str):
+    entrada = _config_cache.get(discord_user_id)
+    if entrada and entrada[0] > time.monotonic():
+        _config_stats['aciertos'] += 1
+        return entrada[1], entrada[2]
+    
+    _config_stats['fallos'] += 1
+    # psycopg2 es bloqueante: fuera del loop para no frenar al bot
+    sesion = await en_hilo_db(_leer_sesion, discord_user_id)
+    if not sesion:
+        return None, None
+    
+    config = {
+        "discord_user_id": discord_user_id,
+        "github_username": sesion.get("github_username"),
+        "codespace_name": sesion.get("codespace"),
+        "repo_name": sesion.get("repo_name"),
+        "tunnel_url": sesion.get("tunnel_url"),
+        "tunnel_port": sesion.get("tunnel_port"),
+        "tunnel_type": sesion.get("tunnel_type"),
+        "auto_configured": sesion.get("auto_configured", False)
+    }
+    version = sesion.get("updated_at") or json.dumps(config, sort_keys=True)
+    _config_cache[discord_user_id] = (time.monotonic() + CONFIG_CACHE_TTL, config, version)
+    return config, version
+
+@routes.get('/api/user/config/{discord_user_id}')
+async def get_user_config(request: web.Request):
+    discord_user_id = request.match_info["discord_user_id"]
+    try:
+        config, version = await _cargar_config(discord_user_id)
         
-        if not sesion:
-            return jsonify({"error": "Usuario no encontrado"}), 404
+        if not config:
+            return web.json_response({"error": "Usuario no encontrado"}, status=404)
         
-        return jsonify({
-            "discord_user_id": discord_user_id,
-            "github_username": sesion.get("github_username"),
-            "codespace_name": sesion.get("codespace"),
-            "repo_name": sesion.get("repo_name"),
-            "tunnel_url": sesion.get("tunnel_url"),
-            "tunnel_port": sesion.get("tunnel_port"),
-            "tunnel_type": sesion.get("tunnel_type"),
-            "webhook_url": f"{request.host_url.rstrip('/')}/webhook/tunnel_notify",
-            "auto_configured": sesion.get("auto_configured", False)
-        }), 200
+        webhook_url = f"{request.scheme}://{request.host}/webhook/tunnel_notify"
+        etag = '"' + hashlib.sha1(f"{discord_user_id}:{version}:{webhook_url}".encode()).hexdigest()[:20] + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]:
+            _config_stats['no_modificados'] += 1
+            return web.Response(status=304, headers=headers)
+        
+        return web.json_response({**config, "webhook_url": webhook_url}, status=200, headers=headers)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return web.json_response({"error": str(e)}, status=500)
 
-@app.route('/api/user/tunnel', methods=['POST'])
-def update_tunnel_url():
+@routes.post('/api/user/tunnel')
+async def update_tunnel_url(request: web.Request):
     try:
-        data = request.json
+        data = await leer_json(request)
+        if not data:
+            return web.json_response({"error": "No se recibieron datos"}, status=400)
         
         user_id = data.get("discord_user_id")
         tunnel_url = data.get("tunnel_url")
@@ -47,39 +110,43 @@ def update_tunnel_url():
         tunnel_port = data.get("tunnel_port", 25565)
         
         if not user_id or not tunnel_url:
-            return jsonify({"error": "Faltan campos requeridos"}), 400
+            return web.json_response({"error": "Faltan campos requeridos"}, status=400)
         
-        db = get_db()
-        sesion = db.get_sesion(user_id)
+        sesion = await en_hilo_db(_leer_sesion, user_id)
         
         if not sesion:
-            return jsonify({"error": "Usuario no encontrado"}), 404
+            return web.json_response({"error": "Usuario no encontrado"}, status=404)
         
         sesion["tunnel_url"] = tunnel_url
         sesion["tunnel_type"] = tunnel_type
         sesion["tunnel_port"] = tunnel_port
         sesion["tunnel_actualizado"] = datetime.now().isoformat()
         
-        db.save_sesion(user_id, sesion)
+        await en_hilo_db(get_db().save_sesion, user_id, sesion)
+        notificar_tunnel(user_id, sesion.get("codespace"), {
+            "tunnel_url": tunnel_url,
+            "tunnel_port": tunnel_port,
+            "tunnel_type": tunnel_type
+        })
         
-        return jsonify({
+        return web.json_response({
             "status": "success",
             "message": "Tunnel URL actualizada",
             "tunnel_url": tunnel_url
-        }), 200
+        }, status=200)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return web.json_response({"error": str(e)}, status=500)
 
-@app.route('/webhook/tunnel_notify', methods=['POST'])
-def webhook_tunnel_notify():
+@routes.post('/webhook/tunnel_notify')
+async def webhook_tunnel_notify(request: web.Request):
     try:
         bot = get_bot()
         if not bot:
-            return jsonify({"error": "Bot no disponible"}), 503
+            return web.json_response({"error": "Bot no disponible"}, status=503)
 
-        data = request.json
+        data = await leer_json(request)
         if not data:
-            return jsonify({"error": "No se recibieron datos"}), 400
+            return web.json_response({"error": "No se recibieron datos"}, status=400)
 
         user_id = data.get("user_id")
         codespace_name = data.get("codespace_name")
@@ -89,118 +156,190 @@ def webhook_tunnel_notify():
         voicechat_address = data.get("voicechat_address")
         
         if not all([user_id, codespace_name, tunnel_host]):
-            return jsonify({"error": "Faltan campos requeridos"}), 400
+            return web.json_response({"error": "Faltan campos requeridos"}, status=400)
 
         print(f"📥 Webhook: {tunnel_type} para usuario {user_id}")
         print(f"   Tunnel: {tunnel_host}:{tunnel_port}")
 
-        db = get_db()
-        sesion = db.get_sesion(user_id)
-        
-        if sesion:
-            sesion["tunnel_url"] = tunnel_host
-            sesion["tunnel_port"] = tunnel_port
-            sesion["tunnel_type"] = tunnel_type
-            sesion["voicechat_address"] = voicechat_address
-            sesion["tunnel_actualizado"] = datetime.now().isoformat()
-            sesion["codespace"] = codespace_name
-            
-            db.save_sesion(user_id, sesion)
-            
-            async def send_notification():
-                try:
-                    import discord
-                    
-                    notification_mode = sesion.get("notification_mode", "dm")
-                    
-                    if notification_mode == "disabled":
-                        print(f"🔕 Notificaciones desactivadas para usuario {user_id}")
-                        return False
-                    
-                    description = (
-                        f"**Codespace:** `{codespace_name}`\n"
-                        f"**IP Minecraft:** `{tunnel_host}:{tunnel_port}`\n"
-                    )
-                    
-                    if voicechat_address:
-                        description += f"**IP VoiceChat:** `{voicechat_address}`\n"
-                    
-                    description += "\n✅ Tunnel guardado automáticamente."
-                    
-                    embed = discord.Embed(
-                        title=f"🟢 Tunnel Detectado ({tunnel_type.upper()})",
-                        description=description,
-                        color=discord.Color.green()
-                    )
-                    
-                    if notification_mode == "channel":
-                        channel_id = sesion.get("notification_channel_id")
-                        if channel_id:
-                            try:
-                                channel = bot.get_channel(int(channel_id))
-                                if channel:
-                                    user = await bot.fetch_user(int(user_id))
-                                    embed.description = f"{user.mention}\n\n" + embed.description
-                                    await channel.send(embed=embed)
-                                    print(f"📢 Notificación enviada a canal {channel_id}")
-                                    return True
-                                else:
-                                    print(f"⚠️ Canal {channel_id} no encontrado, enviando DM")
-                                    user = await bot.fetch_user(int(user_id))
-                                    await user.send(embed=embed)
-                                    return True
-                            except:
-                                print(f"❌ Error enviando a canal, intentando DM")
-                                user = await bot.fetch_user(int(user_id))
-                                await user.send(embed=embed)
-                                return True
-                    else:
-                        user = await bot.fetch_user(int(user_id))
-                        await user.send(embed=embed)
-                        print(f"💬 Notificación enviada por DM a {user_id}")
-                        return True
-                except Exception as e:
-                    print(f"❌ Error enviando notificación: {e}")
-                    return False
-
-            loop = bot.loop
-            future = asyncio.run_coroutine_threadsafe(send_notification(), loop)
-            success = future.result(timeout=10)
-
-            return jsonify({
-                "status": "success",
-                "message": "Tunnel guardado",
-                "notification_sent": success
-            }), 200
-        else:
-            return jsonify({
-                "status": "warning",
-                "message": "Usuario no tiene sesión"
-            }), 200
+        # Guardado y notificación van a los workers; el Codespace no espera
+        encolado = get_cola_ingesta().encolar(
+            "tunnel_notify",
+            lambda: procesar_tunnel_notify(
+                user_id, codespace_name, tunnel_type, tunnel_host, tunnel_port, voicechat_address
+            )
+        )
+        if not encolado:
+            return web.json_response(
+                {"error": "Cola de ingesta llena, reintenta más tarde"},
+                status=503,
+                headers={"Retry-After": "5"}
+            )
+
+        return web.json_response({
+            "status": "accepted",
+            "message": "Tunnel recibido, se guardará en breve"
+        }, status=202)
 
     except Exception as e:
         print(f"❌ Error en webhook: {e}")
         import traceback
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        return web.json_response({"error": str(e)}, status=500)
+
+async def procesar_tunnel_notify(user_id, codespace_name, tunnel_type, tunnel_host,
+                                 tunnel_port, voicechat_address):
+    """
+    Persiste el tunnel recibido por webhook (worker de ingesta). La
+    notificación queda en webhook_outbox en la misma transacción y la
+    entrega el relay, así que sobrevive a un reinicio.
+    """
+    sesion = await en_hilo_db(_leer_sesion, user_id)
+    
+    if not sesion:
+        print(f"⚠️ Tunnel de {user_id} ignorado: usuario no tiene sesión")
+        return
+
+    sesion["tunnel_url"] = tunnel_host
+    sesion["tunnel_port"] = tunnel_port
+    sesion["tunnel_type"] = tunnel_type
+    sesion["voicechat_address"] = voicechat_address
+    sesion["tunnel_actualizado"] = datetime.now().isoformat()
+    sesion["codespace"] = codespace_name
+    
+    await en_hilo_db(get_db().save_sesion_con_outbox, user_id, sesion, "tunnel_notify", json.dumps({
+        "user_id": user_id,
+        "codespace_name": codespace_name,
+        "tunnel_type": tunnel_type,
+        "tunnel_host": tunnel_host,
+        "tunnel_port": tunnel_port,
+        "voicechat_address": voicechat_address
+    }))
+    notificar_tunnel(user_id, codespace_name, {
+        "tunnel_url": tunnel_host,
+        "tunnel_port": tunnel_port,
+        "tunnel_type": tunnel_type,
+        "voicechat_address": voicechat_address
+    })
+    get_outbox_relay().despertar()
+
+async def entregar_tunnel_notify(payload: dict):
+    """Handler del relay para las entradas 'tunnel_notify' de webhook_outbox"""
+    await enviar_notificacion_tunnel(
+        payload["user_id"], None, payload["codespace_name"], payload["tunnel_type"],
+        payload["tunnel_host"], payload["tunnel_port"], payload.get("voicechat_address")
+    )
+
+async def enviar_notificacion_tunnel(user_id, sesion, codespace_name, tunnel_type,
+                                     tunnel_host, tunnel_port, voicechat_address) -> bool:
+    """Los errores se propagan para que el relay del outbox reintente"""
+    description = (
+        f"**Codespace:** `{codespace_name}`\n"
+        f"**IP Minecraft:** `{tunnel_host}:{tunnel_port}`\n"
+    )
+    
+    if voicechat_address:
+        description += f"**IP VoiceChat:** `{voicechat_address}`\n"
+    
+    description += "\n✅ Tunnel guardado automáticamente."
+    
+    embed = discord.Embed(
+        title=f"🟢 Tunnel Detectado ({tunnel_type.upper()})",
+        description=description,
+        color=discord.Color.green()
+    )
+    
+    resultado = await get_despachador().notificar_usuario(
+        user_id, embed=embed, origen="tunnel", sesion=sesion, urgente=True, esperar=True
+    )
+    
+    if resultado == DESACTIVADO:
+        print(f"🔕 Notificaciones desactivadas para usuario {user_id}")
+        return False
+    
+    print(f"💬 Notificación de tunnel para {user_id}: {resultado}")
+    return resultado == ENVIADO
 
-@app.route('/health', methods=['GET'])
-def health_check():
+def _comprobar_db() -> bool:
+    db = get_db()
+    if not (db and db.conn):
+        return False
+    with db.conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    return True
+
+def _stats_monitor():
+    # El planificador es del cog de Minecraft; sin bot o sin cog no hay datos
+    bot = get_bot()
+    cog = bot.get_cog("CodespaceMinecraftCog") if bot else None
+    return cog.scheduler.get_stats() if cog else None
+
+@routes.get('/health')
+async def health_check(request: web.Request):
     db_status = "disconnected"
     try:
-        db = get_db()
-        if db and db.conn:
-            db.conn.cursor().execute("SELECT 1")
+        if await en_hilo_db(_comprobar_db):
             db_status = "connected"
     except Exception as e:
         print(f"Health check DB error: {e}")
     
-    return jsonify({
+    outbox_stats = await en_hilo_db(get_outbox_relay().get_stats)
+    
+    return web.json_response({
         "status": "ok",
         "database": db_status,
-        "bot": "running" if get_bot() else "not_ready"
-    }), 200
+        "bot": "running" if get_bot() else "not_ready",
+        "ingesta": get_cola_ingesta().get_stats(),
+        "outbox": outbox_stats,
+        "limites": get_control_carga().get_stats(),
+        "firmas": get_verificador_firmas().get_stats(),
+        "config_cache": {**_config_stats, "entradas": len(_config_cache)},
+        "monitor": _stats_monitor(),
+        "minecraft": {
+            "estado": get_status_cache().get_stats(),
+            "dns": get_resolver().get_stats()
+        },
+        "notificaciones": {
+            "despachador": get_despachador().get_stats(),
+            "entregas": get_entregas().get_stats(),
+            "discord": get_discord_resolver().get_stats(),
+            "eventos": get_event_store().get_stats()
+        }
+    }, status=200)
+
+async def _iniciar_ingesta(app: web.Application):
+    if not get_verificador_firmas().activo:
+        print("⚠️ WEBHOOK_SECRET no configurado: los webhooks no se verifican")
+    try:
+        db = await en_hilo_db(get_db)
+        db.suscribir_cambios_sesion(invalidar_config)
+    except Exception as e:
+        # Sin base de datos el servidor arranca igual; la caché de config
+        # queda cubierta solo por su TTL
+        print(f"⚠️ No se pudo suscribir la caché de config a la base de datos: {e}")
+    get_cola_ingesta().start()
+    get_outbox_relay().start()
+
+async def _detener_ingesta(app: web.Application):
+    await get_cola_ingesta().stop()
+    await get_outbox_relay().stop()
+
+def crear_app() -> web.Application:
+    control = get_control_carga()
+    app = web.Application(middlewares=[control.middleware, verificar_firma, control.middleware_usuario])
+    app.add_routes(routes)
+    relay = get_outbox_relay()
+    relay.configurar(get_bot)
+    relay.registrar("tunnel_notify", entregar_tunnel_notify)
+    registrar_webhooks(app, get_bot)
+    app.on_startup.append(_iniciar_ingesta)
+    app.on_cleanup.append(_detener_ingesta)
+    return app
 
-def run_flask():
+async def iniciar_servidor_web() -> web.AppRunner:
+    """Inicia el servidor HTTP en el loop actual (el del bot)"""
     from config import PORT
-    app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
+    runner = web.AppRunner(crear_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', PORT).start()
+    print(f"🌐 Servidor web escuchando en puerto {PORT}")
+    return runner
\ No newline at end of file
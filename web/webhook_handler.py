@@ -1,21 +1,50 @@
+import json
+
 import discord
-from flask import request, jsonify
+from aiohttp import web
 from utils.embed_factory import crear_embed_error, crear_embed_warning
 from utils.jsondb import safe_load
+from utils.database import get_db, en_hilo_db
+from utils.entregas import FALLIDO
+from utils.despachador import get_despachador
+from web.ingesta import get_cola_ingesta
+from web.outbox import get_outbox_relay
 from config import VINCULACIONES_FILE
 
 
+async def guardar_error_megacmd(user_id, embed):
+    """Deja el aviso en webhook_outbox para que lo entregue el relay (worker de ingesta)"""
+    payload = json.dumps({
+        "user_id": str(user_id),
+        "embed": embed.to_dict()
+    })
+    await en_hilo_db(lambda: get_db().save_outbox(str(user_id), "megacmd", payload))
+    get_outbox_relay().despertar()
+
+
+async def notificar_error_megacmd(payload: dict):
+    """Handler del relay para las entradas 'megacmd' de webhook_outbox"""
+    user_id = payload["user_id"]
+    resultado = await get_despachador().notificar_usuario(
+        user_id, embed=discord.Embed.from_dict(payload["embed"]), origen="megacmd", urgente=True,
+        esperar=True
+    )
+    if resultado == FALLIDO:
+        print(f"❌ No se pudo notificar error de MegaCMD a {user_id} (ver /entregas_fallidas)")
+    else:
+        print(f"💬 Notificación de MegaCMD para {user_id}: {resultado}")
+
+
 def registrar_webhooks(app, bot_instance_getter):
     """
-    Registra los endpoints de webhook en la app Flask
+    Registra los endpoints de webhook en la app aiohttp
     
     Args:
-        app: Instancia de Flask
+        app: Instancia de aiohttp.web.Application
         bot_instance_getter: Función que retorna la instancia del bot
     """
     
-    @app.route('/webhook/megacmd', methods=['POST'])
-    def webhook_megacmd():
+    async def webhook_megacmd(request: web.Request):
         """
         Recibe notificaciones de errores de MegaCMD
         
@@ -31,12 +60,15 @@ def registrar_webhooks(app, bot_instance_getter):
         try:
             bot = bot_instance_getter()
             if not bot:
-                return jsonify({"error": "Bot no disponible"}), 503
+                return web.json_response({"error": "Bot no disponible"}, status=503)
             
-            data = request.json
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
             
             if not data:
-                return jsonify({"error": "No se recibieron datos"}), 400
+                return web.json_response({"error": "No se recibieron datos"}, status=400)
             
             user_id = data.get("user_id")
             error_type = data.get("error_type", "backup_general")
@@ -44,13 +76,13 @@ def registrar_webhooks(app, bot_instance_getter):
             codespace_name = data.get("codespace_name", "Desconocido")
             
             if not user_id:
-                return jsonify({"error": "user_id requerido"}), 400
+                return web.json_response({"error": "user_id requerido"}, status=400)
             
             # Buscar el usuario en vinculaciones
             vinculaciones = safe_load(VINCULACIONES_FILE)
             
             if str(user_id) not in vinculaciones:
-                return jsonify({"error": "Usuario no encontrado"}), 404
+                return web.json_response({"error": "Usuario no encontrado"}, status=404)
             
             # Mapear tipos de error a títulos y descripciones
             error_info = {
@@ -97,58 +129,35 @@ def registrar_webhooks(app, bot_instance_getter):
                 footer="Revisa los logs de MegaCMD para más detalles"
             )
             
-            # Enviar DM al usuario
-            try:
-                # Usar asyncio para ejecutar la coroutine desde Flask
-                import asyncio
-                
-                # Obtener el loop del bot
-                loop = bot.loop
-                
-                # Crear la tarea de envío
-                async def send_notification():
-                    try:
-                        user = await bot.fetch_user(int(user_id))
-                        await user.send(embed=embed)
-                        return True, "Notificación enviada"
-                    except discord.Forbidden:
-                        return False, "No se pudo enviar DM (usuario tiene DMs bloqueados)"
-                    except discord.NotFound:
-                        return False, "Usuario no encontrado"
-                    except Exception as e:
-                        return False, f"Error enviando notificación: {str(e)}"
-                
-                # Ejecutar de forma asíncrona
-                future = asyncio.run_coroutine_threadsafe(send_notification(), loop)
-                success, message = future.result(timeout=10)
-                
-                if success:
-                    return jsonify({
-                        "status": "success",
-                        "message": message
-                    }), 200
-                else:
-                    return jsonify({
-                        "status": "error",
-                        "message": message
-                    }), 400
-                    
-            except Exception as e:
-                return jsonify({
-                    "status": "error",
-                    "message": f"Error procesando notificación: {str(e)}"
-                }), 500
+            # Un worker lo deja en el outbox y el relay lo entrega; se responde sin esperar
+            if not get_cola_ingesta().encolar("megacmd", lambda: guardar_error_megacmd(user_id, embed)):
+                return web.json_response(
+                    {"error": "Cola de ingesta llena, reintenta más tarde"},
+                    status=503,
+                    headers={"Retry-After": "5"}
+                )
+            
+            return web.json_response({
+                "status": "accepted",
+                "message": "Notificación en cola"
+            }, status=202)
         
         except Exception as e:
             print(f"Error en webhook MegaCMD: {e}")
-            return jsonify({"error": str(e)}), 500
+            return web.json_response({"error": str(e)}, status=500)
     
-    @app.route('/webhook/test', methods=['POST'])
-    def webhook_test():
+    async def webhook_test(request: web.Request):
         """Endpoint de prueba para verificar que los webhooks funcionan"""
-        data = request.json
-        return jsonify({
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        return web.json_response({
             "status": "success",
             "received": data,
             "message": "Webhook funcionando correctamente"
-        }), 200
+        }, status=200)
+    
+    get_outbox_relay().registrar("megacmd", notificar_error_megacmd)
+    app.router.add_post('/webhook/megacmd', webhook_megacmd)
+    app.router.add_post('/webhook/test', webhook_test)